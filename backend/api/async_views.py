@@ -0,0 +1,277 @@
+import asyncio
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.urls import resolve
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from ingredients.models import Ingredient
+from ingredients.search import SEARCH_RESULTS_LIMIT, ingredient_search
+from recipes.models import Recipe
+from recipes.short_links import decode_short_link
+from tags.models import Tag
+from .filters import IngredientFilter, RecipeFilter
+from .pagination import (
+    CachedCountPaginator,
+    CustomPaginationClass,
+    KeysetPagination,
+)
+from .relations import preload_subscriptions
+from .response_cache import (
+    CACHE_HEADER,
+    aget_cached_data,
+    get_detail_cache_key,
+    get_list_cache_key,
+)
+from .serializers import (
+    IngredientSerializer,
+    RecipeReadSerializer,
+    TagSerializer,
+)
+
+
+SYNC_URLCONF = 'foodgram.urls'
+ASYNC_METHODS = ('GET', 'HEAD')
+INVALID_PAGE_MESSAGE = 'Invalid page.'
+JSON_DUMPS_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+def render(data, status=200, headers=None):
+    return JsonResponse(
+        data,
+        encoder=JSONEncoder,
+        safe=False,
+        status=status,
+        headers=headers,
+        json_dumps_params=JSON_DUMPS_PARAMS,
+    )
+
+
+async def aauthenticate(request):
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b'token':
+        return AnonymousUser()
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed('Invalid token header.')
+    try:
+        token = await Token.objects.select_related('user').aget(
+            key=auth[1].decode()
+        )
+    except (Token.DoesNotExist, UnicodeError):
+        raise exceptions.AuthenticationFailed('Invalid token.')
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed('User inactive or deleted.')
+    return token.user
+
+
+async def afetch(queryset):
+    return [item async for item in queryset]
+
+
+def in_own_connection(func):
+    close_old_connections()
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+async def gather_reads(*funcs):
+    # Each read runs in its own executor thread and therefore on its own
+    # database connection, so independent queries overlap instead of
+    # queueing on the single thread used by the async ORM. All reads are
+    # awaited before an error is raised so none outlives the request.
+    results = await asyncio.gather(
+        *(
+            sync_to_async(in_own_connection, thread_sensitive=False)(func)
+            for func in funcs
+        ),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return results
+
+
+def async_read_view(view):
+    @csrf_exempt
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if (
+            request.method not in ASYNC_METHODS
+            or KeysetPagination.cursor_query_param in request.GET
+        ):
+            match = resolve(request.path_info, urlconf=SYNC_URLCONF)
+            return await sync_to_async(match.func)(
+                request, *match.args, **match.kwargs
+            )
+        try:
+            api_request = Request(request)
+            api_request.user = await aauthenticate(request)
+            return await view(api_request, *args, **kwargs)
+        except Http404 as exc:
+            return render(
+                {'detail': exceptions.NotFound(*exc.args).detail}, 404
+            )
+        except exceptions.APIException as exc:
+            headers = None
+            if isinstance(exc, exceptions.AuthenticationFailed):
+                headers = {'WWW-Authenticate': 'Token'}
+            data = exc.detail
+            if not isinstance(data, (dict, list)):
+                data = {'detail': data}
+            return render(data, exc.status_code, headers)
+
+    return wrapper
+
+
+def filter_queryset(request, filterset_class, queryset):
+    filterset = filterset_class(
+        request.query_params, queryset=queryset, request=request
+    )
+    if not filterset.is_valid():
+        raise exceptions.ValidationError(filterset.errors)
+    return filterset.qs
+
+
+def get_page_number(request, pagination):
+    try:
+        page_number = int(
+            request.query_params.get(pagination.page_query_param) or 1
+        )
+    except ValueError:
+        raise exceptions.NotFound(INVALID_PAGE_MESSAGE)
+    if page_number < 1:
+        raise exceptions.NotFound(INVALID_PAGE_MESSAGE)
+    return page_number
+
+
+def get_page_link(request, pagination, page_number):
+    url = request.build_absolute_uri()
+    if page_number == 1:
+        return remove_query_param(url, pagination.page_query_param)
+    return replace_query_param(url, pagination.page_query_param, page_number)
+
+
+async def get_recipe_page(request):
+    queryset = filter_queryset(
+        request, RecipeFilter, Recipe.objects.for_read(request.user)
+    )
+    pagination = CustomPaginationClass()
+    page_size = pagination.get_page_size(request)
+    page_number = get_page_number(request, pagination)
+    paginator = CachedCountPaginator(
+        queryset,
+        page_size,
+        cache_key=pagination.get_count_cache_key(request, None),
+    )
+    offset = (page_number - 1) * page_size
+    (count, count_exact), recipes, _ = await gather_reads(
+        lambda: paginator.counted,
+        lambda: list(queryset[offset:offset + page_size + 1]),
+        partial(preload_subscriptions, request),
+    )
+    if not recipes and page_number > 1:
+        raise exceptions.NotFound(INVALID_PAGE_MESSAGE)
+    has_next = len(recipes) > page_size
+    recipes = recipes[:page_size]
+    return {
+        'count': count,
+        'count_exact': count_exact,
+        'next': (
+            get_page_link(request, pagination, page_number + 1)
+            if has_next else None
+        ),
+        'previous': (
+            get_page_link(request, pagination, page_number - 1)
+            if page_number > 1 else None
+        ),
+        'results': RecipeReadSerializer(
+            recipes, many=True, context={'request': request}
+        ).data,
+    }
+
+
+@async_read_view
+async def recipe_list(request):
+    data, cache_state = await aget_cached_data(
+        request,
+        lambda: get_list_cache_key(request),
+        lambda: get_recipe_page(request),
+    )
+    return render(data, headers=cache_state and {CACHE_HEADER: cache_state})
+
+
+@async_read_view
+async def recipe_detail(request, pk):
+    async def get_data():
+        recipe, _ = await gather_reads(
+            partial(
+                get_object_or_404,
+                Recipe.objects.for_read(request.user),
+                pk=pk,
+            ),
+            partial(preload_subscriptions, request),
+        )
+        return RecipeReadSerializer(
+            recipe, context={'request': request}
+        ).data
+
+    data, cache_state = await aget_cached_data(
+        request, lambda: get_detail_cache_key(request, pk), get_data
+    )
+    return render(data, headers=cache_state and {CACHE_HEADER: cache_state})
+
+
+@async_read_view
+async def ingredient_list(request):
+    name = request.query_params.get('name')
+    if name:
+        results = await sync_to_async(ingredient_search.search)(name)
+        if results is not None:
+            return render(results)
+    queryset = filter_queryset(
+        request, IngredientFilter, Ingredient.objects.all()
+    )
+    if name:
+        queryset = queryset[:SEARCH_RESULTS_LIMIT]
+    ingredients = await afetch(queryset)
+    return render(IngredientSerializer(ingredients, many=True).data)
+
+
+@async_read_view
+async def ingredient_detail(request, pk):
+    ingredient = await aget_object_or_404(Ingredient, pk=pk)
+    return render(IngredientSerializer(ingredient).data)
+
+
+@async_read_view
+async def tag_list(request):
+    tags = await afetch(Tag.objects.all())
+    return render(TagSerializer(tags, many=True).data)
+
+
+@async_read_view
+async def tag_detail(request, pk):
+    tag = await aget_object_or_404(Tag, pk=pk)
+    return render(TagSerializer(tag).data)
+
+
+async def redirect_to_recipe(request, short_link):
+    recipe_id = decode_short_link(short_link)
+    lookup = (
+        {'short_link': short_link} if recipe_id is None else {'pk': recipe_id}
+    )
+    recipe = await aget_object_or_404(Recipe.objects.only('id'), **lookup)
+    return HttpResponseRedirect(f'/recipes/{recipe.id}/')
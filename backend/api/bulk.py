@@ -0,0 +1,159 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from recipes.aggregates import (
+    apply_shopping_list_changes,
+    get_recipes_amounts,
+    negate_amounts,
+)
+from recipes.background import run_in_background
+from recipes.feed import backfill_feed, trim_feed
+from recipes.models import FavoritesListRecipe, Recipe, ShoppingCartRecipe
+from recipes.signals import (
+    applying_bulk_changes,
+    bump_shopping_cart_version,
+    change_recipes_stats,
+)
+from users.models import Subscriptions
+
+
+User = get_user_model()
+
+BULK_MAX_ITEMS = 100
+CREATED = 'created'
+EXISTS = 'exists'
+DELETED = 'deleted'
+MISSING = 'missing'
+NOT_FOUND = 'not_found'
+SELF_SUBSCRIPTION = 'self_subscription'
+RECIPE_COUNTERS = {
+    FavoritesListRecipe: 'favorites_count',
+    ShoppingCartRecipe: 'shopping_cart_count',
+}
+
+
+def get_statuses(ids, default, **groups):
+    statuses = {
+        pk: status for status, pks in groups.items() for pk in pks
+    }
+    return [{'id': pk, 'status': statuses.get(pk, default)} for pk in ids]
+
+
+def delete_explicitly(queryset):
+    with applying_bulk_changes():
+        return queryset.delete()
+
+
+def lock_user(user):
+    User.objects.select_for_update().filter(pk=user.pk).exists()
+
+
+@transaction.atomic
+def add_recipes(model, user, recipe_ids):
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    lock_user(user)
+    found = set(
+        Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', flat=True)
+    )
+    existing = set(
+        model.objects.filter(user=user, recipe_id__in=found).values_list(
+            'recipe_id', flat=True
+        )
+    )
+    events = model.objects.bulk_create(
+        model(user=user, recipe_id=recipe_id)
+        for recipe_id in recipe_ids
+        if recipe_id in found and recipe_id not in existing
+    )
+    created = {event.recipe_id for event in events}
+    change_recipes_stats(events, RECIPE_COUNTERS[model], 1)
+    if model is ShoppingCartRecipe and created:
+        apply_shopping_list_changes([user.pk], get_recipes_amounts(created))
+        bump_shopping_cart_version(User.objects.filter(pk=user.pk))
+    return get_statuses(
+        recipe_ids, NOT_FOUND, **{EXISTS: existing, CREATED: created}
+    )
+
+
+@transaction.atomic
+def remove_recipes(model, user, recipe_ids):
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    lock_user(user)
+    events = list(
+        model.objects.select_for_update().filter(
+            user=user, recipe_id__in=recipe_ids
+        )
+    )
+    removed = {event.recipe_id for event in events}
+    delete_explicitly(
+        model.objects.filter(pk__in=[event.pk for event in events])
+    )
+    change_recipes_stats(events, RECIPE_COUNTERS[model], -1)
+    if model is ShoppingCartRecipe and removed:
+        apply_shopping_list_changes(
+            [user.pk], negate_amounts(get_recipes_amounts(removed))
+        )
+        bump_shopping_cart_version(User.objects.filter(pk=user.pk))
+    return get_statuses(recipe_ids, MISSING, **{DELETED: removed})
+
+
+def change_subscribers_counts(user_ids, delta):
+    User.objects.filter(pk__in=user_ids).update(
+        subscribers_count=Greatest(F('subscribers_count') + delta, 0)
+    )
+
+
+@transaction.atomic
+def subscribe_to_authors(user, author_ids):
+    author_ids = list(dict.fromkeys(author_ids))
+    lock_user(user)
+    found = set(
+        User.objects.filter(pk__in=author_ids)
+        .exclude(pk=user.pk)
+        .values_list('pk', flat=True)
+    )
+    existing = set(
+        Subscriptions.objects.filter(
+            subscriber=user, subscribed_to_id__in=found
+        ).values_list('subscribed_to_id', flat=True)
+    )
+    subscriptions = Subscriptions.objects.bulk_create(
+        Subscriptions(subscriber=user, subscribed_to_id=author_id)
+        for author_id in author_ids
+        if author_id in found and author_id not in existing
+    )
+    created = {
+        subscription.subscribed_to_id for subscription in subscriptions
+    }
+    change_subscribers_counts(created, 1)
+    for author_id in created:
+        run_in_background(backfill_feed, user.pk, author_id)
+    return get_statuses(
+        author_ids,
+        NOT_FOUND,
+        **{
+            SELF_SUBSCRIPTION: {user.pk},
+            EXISTS: existing,
+            CREATED: created,
+        },
+    )
+
+
+@transaction.atomic
+def unsubscribe_from_authors(user, author_ids):
+    author_ids = list(dict.fromkeys(author_ids))
+    lock_user(user)
+    subscriptions = Subscriptions.objects.filter(
+        subscriber=user, subscribed_to_id__in=author_ids
+    )
+    removed = set(
+        subscriptions.select_for_update().values_list(
+            'subscribed_to_id', flat=True
+        )
+    )
+    delete_explicitly(subscriptions.filter(subscribed_to_id__in=removed))
+    change_subscribers_counts(removed, -1)
+    trim_feed(user.pk, *removed)
+    return get_statuses(author_ids, MISSING, **{DELETED: removed})
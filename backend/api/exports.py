@@ -0,0 +1,106 @@
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import ShoppingListExport
+from .shopping_list import get_shopping_list_pdf
+
+
+User = get_user_model()
+Status = ShoppingListExport.Status
+
+EMPTY_CART_ERROR = 'Your shopping cart is empty.'
+CART_CHANGED_ERROR = (
+    'Your shopping cart has changed since the export was requested.'
+)
+
+
+def enqueue_export(user):
+    job, created = ShoppingListExport.objects.get_or_create(
+        user=user, cart_version=user.shopping_cart_version
+    )
+    expired = job.status == Status.DONE and job.expires <= timezone.now()
+    if created or not (job.status == Status.FAILED or expired):
+        return job
+    job.file.delete(save=False)
+    job.status = Status.PENDING
+    job.error = ''
+    job.started = job.expires = None
+    job.save(update_fields=['file', 'status', 'error', 'started', 'expires'])
+    return job
+
+
+def claim_export():
+    with transaction.atomic():
+        job = (
+            ShoppingListExport.objects.select_for_update(skip_locked=True)
+            .filter(status=Status.PENDING)
+            .order_by('created')
+            .first()
+        )
+        if job is None:
+            return None
+        job.started = timezone.now()
+        claimed = ShoppingListExport.objects.filter(
+            pk=job.pk, status=Status.PENDING
+        ).update(status=Status.RUNNING, started=job.started)
+    return job if claimed else None
+
+
+def cart_changed(job):
+    return not User.objects.filter(
+        pk=job.user_id, shopping_cart_version=job.cart_version
+    ).exists()
+
+
+def run_export(job):
+    try:
+        changed = cart_changed(job)
+        pdf = None if changed else get_shopping_list_pdf(job.user)
+        if pdf is not None:
+            changed = cart_changed(job)
+        if changed:
+            job.status = Status.FAILED
+            job.error = CART_CHANGED_ERROR
+        elif pdf is None:
+            job.status = Status.FAILED
+            job.error = EMPTY_CART_ERROR
+        else:
+            job.file.save(f'{uuid4().hex}.pdf', ContentFile(pdf), save=False)
+            job.status = Status.DONE
+    except Exception as error:
+        job.status = Status.FAILED
+        job.error = str(error)
+    job.expires = timezone.now() + timedelta(
+        seconds=settings.SHOPPING_LIST_EXPORT_TTL
+    )
+    job.save(update_fields=['file', 'status', 'error', 'expires'])
+    return job
+
+
+def requeue_stale_exports(timeout):
+    return ShoppingListExport.objects.filter(
+        status=Status.RUNNING,
+        started__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status=Status.PENDING, started=None)
+
+
+def cleanup_exports():
+    now = timezone.now()
+    expired = ShoppingListExport.objects.filter(
+        expires__lt=now, status__in=(Status.DONE, Status.FAILED)
+    )
+    count = 0
+    for job in expired.only('pk', 'file'):
+        deleted, _ = ShoppingListExport.objects.filter(
+            pk=job.pk, expires__lt=now
+        ).delete()
+        if deleted:
+            job.file.delete(save=False)
+            count += 1
+    return count
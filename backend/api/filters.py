@@ -1,8 +1,16 @@
-from django.db.models import Q
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Lower
 from django_filters import rest_framework as filters
 
 from ingredients.models import Ingredient
-from recipes.models import Recipe
+from recipes.models import FavoritesListRecipe, Recipe, ShoppingCartRecipe
+from recipes.popularity import POPULAR_ORDERING
+from recipes.search import search_recipes
+from tags.models import Tag
+
+
+POPULAR = 'popular'
+ORDERING_CHOICES = ((POPULAR, 'Популярные'),)
 
 
 class RecipeFilter(filters.FilterSet):
@@ -12,34 +20,72 @@ class RecipeFilter(filters.FilterSet):
     )
     author = filters.NumberFilter(field_name='author__id')
     tags = filters.CharFilter(method='filter_tags')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=ORDERING_CHOICES, method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+        fields = (
+            'is_favorited',
+            'is_in_shopping_cart',
+            'author',
+            'tags',
+            'search',
+            'ordering',
+        )
+
+    def filter_user_relation(self, queryset, model, value):
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+        related = Exists(
+            model.objects.filter(user=user, recipe=OuterRef('pk'))
+        )
+        return queryset.filter(related if value else ~related)
 
     def filter_is_favorited(self, queryset, name, value):
-        if value:
-            return queryset.filter(favorites_list__user=self.request.user)
-        else:
-            return queryset.exclude(favorites_list__user=self.request.user)
+        return self.filter_user_relation(queryset, FavoritesListRecipe, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            return queryset.filter(shopping_cart__user=self.request.user)
-        else:
-            return queryset.exclude(shopping_cart__user=self.request.user)
+        return self.filter_user_relation(queryset, ShoppingCartRecipe, value)
 
     def filter_tags(self, queryset, name, value):
-        tags = self.request.query_params.getlist('tags')
-        q_objects = Q()
-        for tag in tags:
-            q_objects |= Q(tags__slug__iexact=tag.strip())
-        return queryset.filter(q_objects).distinct()
+        slugs = {
+            tag.strip().lower()
+            for tag in self.request.query_params.getlist('tags')
+        }
+        tag_ids = (
+            Tag.objects.annotate(slug_lower=Lower('slug'))
+            .filter(slug_lower__in=slugs)
+            .values('id')
+        )
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef('pk'), tag__in=tag_ids
+                )
+            )
+        )
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value).order_by(
+            '-search_rank', '-created', '-id'
+        )
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*POPULAR_ORDERING)
 
 
 class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith')
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ['name']
+
+    def filter_name(self, queryset, name, value):
+        return queryset.filter(search_name__startswith=value.casefold())
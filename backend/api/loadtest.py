@@ -0,0 +1,465 @@
+import itertools
+import math
+import random
+import threading
+from collections import defaultdict
+from time import perf_counter
+
+import requests
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+
+from ingredients.models import Ingredient
+from recipes.models import (
+    FavoritesListRecipe,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartRecipe,
+)
+from tags.models import Tag
+from users.models import Subscriptions
+
+
+User = get_user_model()
+
+BENCHMARK_EMAIL_DOMAIN = 'benchmark.local'
+BENCHMARK_PASSWORD = 'benchmark-password'
+PAGE_SIZE = 6
+MAX_FEED_PAGE = 5
+HTTP_TIMEOUT = 30
+SEARCH_WORDS = ('борщ', 'салат', 'суп', 'пирог', 'soup', 'salad', 'pie')
+PANTRY_SIZES = (3, 12)
+DEFAULT_MIX = {
+    'feed_anonymous': 15,
+    'feed': 15,
+    'popular': 5,
+    'recipe_detail': 20,
+    'similar': 3,
+    'filter_tags': 8,
+    'filter_author': 5,
+    'filter_favorited': 5,
+    'filter_shopping_cart': 3,
+    'search': 3,
+    'ingredients_search': 8,
+    'pantry': 3,
+    'tags': 3,
+    'favorite_toggle': 4,
+    'shopping_cart_toggle': 4,
+    'download_shopping_cart': 2,
+    'subscriptions': 4,
+    'subscription_feed': 5,
+    'subscribe_toggle': 2,
+}
+
+
+class Dataset:
+    def __init__(self):
+        users = User.objects.filter(
+            email__endswith=f'@{BENCHMARK_EMAIL_DOMAIN}',
+            auth_token__isnull=False,
+        ).order_by('pk')
+        self.users = list(users.values_list('pk', 'auth_token__key'))
+        self.recipe_ids = list(
+            Recipe.objects.filter(author__in=users).values_list(
+                'pk', flat=True
+            )
+        )
+        self.tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        self.ingredient_names = list(
+            Ingredient.objects.values_list('name', flat=True)[:1000]
+        )
+        self.ingredient_ids = list(
+            RecipeIngredient.objects.filter(recipe__author__in=users)
+            .values_list('ingredient_id', flat=True)
+            .distinct()
+            .order_by('ingredient_id')
+        )
+        self.favorites = self.get_related_ids(FavoritesListRecipe, 'recipe')
+        self.cart = self.get_related_ids(ShoppingCartRecipe, 'recipe')
+        self.subscriptions = self.get_related_ids(
+            Subscriptions, 'subscribed_to', user_field='subscriber'
+        )
+
+    def get_related_ids(self, model, field, user_field='user'):
+        related = defaultdict(set)
+        for user_id, related_id in model.objects.filter(
+            **{f'{user_field}__in': [user_id for user_id, _ in self.users]}
+        ).values_list(f'{user_field}_id', f'{field}_id'):
+            related[user_id].add(related_id)
+        return related
+
+
+def pick_other(rng, candidates, excluded, attempts=20):
+    for _ in range(attempts):
+        candidate = rng.choice(candidates)
+        if candidate not in excluded:
+            return candidate
+    return None
+
+
+def get(name, path, token=None):
+    return (name, 'GET', path, token, (200,))
+
+
+def toggle(name, path, token):
+    return [
+        (f'{name}_add', 'POST', path, token, (201,)),
+        (f'{name}_remove', 'DELETE', path, token, (204,)),
+    ]
+
+
+def feed_page(rng):
+    return f'limit={PAGE_SIZE}&page={rng.randint(1, MAX_FEED_PAGE)}'
+
+
+def feed_anonymous(rng, dataset, user):
+    return [get('feed_anonymous', f'/api/recipes/?{feed_page(rng)}')]
+
+
+def feed(rng, dataset, user):
+    return [get('feed', f'/api/recipes/?{feed_page(rng)}', user[1])]
+
+
+def popular(rng, dataset, user):
+    return [get('popular', f'/api/recipes/popular/?{feed_page(rng)}')]
+
+
+def recipe_detail(rng, dataset, user):
+    token = user[1] if rng.random() < 0.5 else None
+    path = f'/api/recipes/{rng.choice(dataset.recipe_ids)}/'
+    return [get('recipe_detail', path, token)]
+
+
+def similar(rng, dataset, user):
+    recipe_id = rng.choice(dataset.recipe_ids)
+    return [get('similar', f'/api/recipes/{recipe_id}/similar/')]
+
+
+def filter_tags(rng, dataset, user):
+    tags = '&'.join(
+        f'tags={slug}'
+        for slug in rng.sample(
+            dataset.tag_slugs, min(2, len(dataset.tag_slugs))
+        )
+    )
+    return [get('filter_tags', f'/api/recipes/?{tags}&limit={PAGE_SIZE}')]
+
+
+def filter_author(rng, dataset, user):
+    author_id = rng.choice(dataset.users)[0]
+    return [
+        get('filter_author', f'/api/recipes/?author={author_id}', user[1])
+    ]
+
+
+def filter_favorited(rng, dataset, user):
+    return [
+        get('filter_favorited', '/api/recipes/?is_favorited=1', user[1])
+    ]
+
+
+def filter_shopping_cart(rng, dataset, user):
+    return [
+        get(
+            'filter_shopping_cart',
+            '/api/recipes/?is_in_shopping_cart=1',
+            user[1],
+        )
+    ]
+
+
+def search(rng, dataset, user):
+    return [get('search', f'/api/recipes/?search={rng.choice(SEARCH_WORDS)}')]
+
+
+def ingredients_search(rng, dataset, user):
+    name = rng.choice(dataset.ingredient_names)
+    prefix = name[:rng.randint(1, min(len(name), 4))]
+    return [get('ingredients_search', f'/api/ingredients/?name={prefix}')]
+
+
+def pantry(rng, dataset, user):
+    ingredient_ids = rng.sample(
+        dataset.ingredient_ids,
+        min(len(dataset.ingredient_ids), rng.randint(*PANTRY_SIZES)),
+    )
+    query = '&'.join(f'ingredients={pk}' for pk in ingredient_ids)
+    return [get('pantry', f'/api/recipes/pantry/?{query}')]
+
+
+def tags(rng, dataset, user):
+    return [get('tags', '/api/tags/')]
+
+
+def favorite_toggle(rng, dataset, user):
+    recipe_id = pick_other(
+        rng, dataset.recipe_ids, dataset.favorites[user[0]]
+    )
+    if recipe_id is None:
+        return []
+    return toggle('favorite', f'/api/recipes/{recipe_id}/favorite/', user[1])
+
+
+def shopping_cart_toggle(rng, dataset, user):
+    recipe_id = pick_other(rng, dataset.recipe_ids, dataset.cart[user[0]])
+    if recipe_id is None:
+        return []
+    return toggle(
+        'shopping_cart', f'/api/recipes/{recipe_id}/shopping_cart/', user[1]
+    )
+
+
+def download_shopping_cart(rng, dataset, user):
+    return [
+        get(
+            'download_shopping_cart',
+            '/api/recipes/download_shopping_cart/',
+            user[1],
+        )
+    ]
+
+
+def subscriptions(rng, dataset, user):
+    return [
+        get(
+            'subscriptions',
+            f'/api/users/subscriptions/?limit={PAGE_SIZE}&recipes_limit=3',
+            user[1],
+        )
+    ]
+
+
+def subscription_feed(rng, dataset, user):
+    return [
+        get(
+            'subscription_feed',
+            f'/api/recipes/feed/?{feed_page(rng)}',
+            user[1],
+        )
+    ]
+
+
+def subscribe_toggle(rng, dataset, user):
+    author_id = pick_other(
+        rng,
+        [author_id for author_id, _ in dataset.users],
+        dataset.subscriptions[user[0]] | {user[0]},
+    )
+    if author_id is None:
+        return []
+    return toggle('subscribe', f'/api/users/{author_id}/subscribe/', user[1])
+
+
+SCENARIOS = {
+    'feed_anonymous': feed_anonymous,
+    'feed': feed,
+    'popular': popular,
+    'recipe_detail': recipe_detail,
+    'similar': similar,
+    'filter_tags': filter_tags,
+    'filter_author': filter_author,
+    'filter_favorited': filter_favorited,
+    'filter_shopping_cart': filter_shopping_cart,
+    'search': search,
+    'ingredients_search': ingredients_search,
+    'pantry': pantry,
+    'tags': tags,
+    'favorite_toggle': favorite_toggle,
+    'shopping_cart_toggle': shopping_cart_toggle,
+    'download_shopping_cart': download_shopping_cart,
+    'subscriptions': subscriptions,
+    'subscription_feed': subscription_feed,
+    'subscribe_toggle': subscribe_toggle,
+}
+
+
+class InProcessTransport:
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def request(self, method, path, token):
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = self.client.generic(method, path, headers=headers)
+            if response.streaming:
+                size = len(b''.join(response.streaming_content))
+            else:
+                size = len(response.content)
+        elapsed = (perf_counter() - started) * 1000
+        return response.status_code, elapsed, size, queries
+
+    def close(self):
+        connection.close()
+
+
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, token):
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        started = perf_counter()
+        try:
+            response = self.session.request(
+                method,
+                f'{self.base_url}{path}',
+                headers=headers,
+                allow_redirects=False,
+                timeout=HTTP_TIMEOUT,
+            )
+        except requests.RequestException:
+            return 0, (perf_counter() - started) * 1000, 0, None
+        elapsed = (perf_counter() - started) * 1000
+        return response.status_code, elapsed, len(response.content), None
+
+    def close(self):
+        self.session.close()
+
+
+class LoadTest:
+    def __init__(
+        self,
+        dataset,
+        mix,
+        transport_factory,
+        concurrency,
+        duration=None,
+        total_requests=None,
+        warmup=0,
+        seed=1,
+    ):
+        self.dataset = dataset
+        self.mix = {name: weight for name, weight in mix.items() if weight}
+        self.transport_factory = transport_factory
+        self.concurrency = concurrency
+        self.duration = duration
+        self.total_requests = total_requests
+        self.warmup = warmup
+        self.seed = seed
+
+    def should_stop(self):
+        now = perf_counter()
+        if self.deadline is not None and now >= self.deadline:
+            return True
+        return (
+            self.total_requests is not None
+            and now >= self.recording_from
+            and next(self.issued) >= self.total_requests
+        )
+
+    def worker(self, index, results):
+        rng = random.Random(self.seed + index)
+        user = self.dataset.users[index % len(self.dataset.users)]
+        names, weights = zip(*self.mix.items())
+        samples = defaultdict(list)
+        transport = self.transport_factory()
+        try:
+            while not self.should_stop():
+                scenario = SCENARIOS[rng.choices(names, weights)[0]]
+                for name, method, path, token, expected in scenario(
+                    rng, self.dataset, user
+                ):
+                    status, elapsed, size, queries = transport.request(
+                        method, path, token
+                    )
+                    if perf_counter() >= self.recording_from:
+                        samples[name].append(
+                            (status in expected, elapsed, size, queries)
+                        )
+        finally:
+            transport.close()
+            results[index] = samples
+
+    def run(self):
+        self.issued = itertools.count()
+        started = perf_counter()
+        self.recording_from = started + self.warmup
+        self.deadline = (
+            self.recording_from + self.duration if self.duration else None
+        )
+        results = [None] * self.concurrency
+        threads = [
+            threading.Thread(target=self.worker, args=(index, results))
+            for index in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - max(started, self.recording_from)
+        merged = defaultdict(list)
+        for samples in results:
+            for name, values in (samples or {}).items():
+                merged[name].extend(values)
+        return summarize_all(merged, elapsed)
+
+
+def percentile(values, fraction):
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(elapsed_ms for _, elapsed_ms, _, _ in samples)
+    queries = [count for _, _, _, count in samples if count is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(not ok for ok, _, _, _ in samples),
+        'rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'p50': round(percentile(latencies, 0.5), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'max': round(latencies[-1], 2),
+        },
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2),
+            'max': max(queries),
+        } if queries else None,
+        'bytes_mean': round(
+            sum(size for _, _, size, _ in samples) / len(samples)
+        ),
+    }
+
+
+def summarize_all(merged, elapsed):
+    return {
+        'elapsed_s': round(elapsed, 2),
+        'endpoints': {
+            name: summarize(samples, elapsed)
+            for name, samples in sorted(merged.items())
+        },
+        'total': summarize(
+            list(itertools.chain.from_iterable(merged.values())), elapsed
+        ) if merged else None,
+    }
+
+
+def compare(current, previous):
+    rows = []
+    for name, stats in current['endpoints'].items():
+        old = previous.get('endpoints', {}).get(name)
+        if old is None:
+            continue
+        changes = {
+            metric: (
+                stats['latency_ms'][metric] / old['latency_ms'][metric] - 1
+                if old['latency_ms'][metric] else None
+            )
+            for metric in ('p50', 'p95', 'p99')
+        }
+        changes['rps'] = (
+            stats['rps'] / old['rps'] - 1 if old.get('rps') else None
+        )
+        rows.append((name, changes))
+    return rows
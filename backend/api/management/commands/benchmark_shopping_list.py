@@ -0,0 +1,64 @@
+from statistics import median
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.shopping_list import get_cache_key
+from api.views import RecipeViewSet
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare cold and warm shopping list download latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', type=str, help='Email of the user')
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Number of downloads per mode',
+        )
+
+    def handle(self, *args, **kwargs):
+        try:
+            user = User.objects.get(email=kwargs['email'])
+        except User.DoesNotExist:
+            raise CommandError('User not found')
+        view = RecipeViewSet.as_view({'get': 'download_shopping_cart'})
+        factory = APIRequestFactory()
+
+        def download():
+            request = factory.get('/api/recipes/download_shopping_cart/')
+            force_authenticate(request, user=user)
+            started = perf_counter()
+            response = view(request)
+            if response.status_code != 200:
+                raise CommandError('Shopping cart is empty')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            else:
+                response.content
+            return (perf_counter() - started) * 1000
+
+        cold, warm = [], []
+        for _ in range(kwargs['iterations']):
+            cache.delete(get_cache_key(user))
+            cold.append(download())
+            warm.append(download())
+
+        for mode, timings in (('cold', cold), ('warm', warm)):
+            self.stdout.write(
+                f'{mode}: median {median(timings):.2f} ms, '
+                f'min {min(timings):.2f} ms, max {max(timings):.2f} ms'
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Speedup: {median(cold) / median(warm):.1f}x'
+            )
+        )
@@ -0,0 +1,172 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.loadtest import (
+    DEFAULT_MIX,
+    SCENARIOS,
+    Dataset,
+    HttpTransport,
+    InProcessTransport,
+    LoadTest,
+    compare,
+)
+
+
+class Command(BaseCommand):
+    help = 'Replay a weighted mix of API requests and report latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Seconds to measure, ignored when --requests is given',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            help='Approximate number of measured requests',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=float,
+            default=5,
+            help='Seconds of load before measuring starts',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--mix',
+            nargs='*',
+            default=[],
+            metavar='SCENARIO=WEIGHT',
+            help='Override scenario weights, 0 disables a scenario',
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Send requests over HTTP instead of in-process',
+        )
+        parser.add_argument(
+            '--output',
+            default='loadtest.json',
+            help='Path of the JSON result file',
+        )
+        parser.add_argument('--label', default='', help='Label for the run')
+        parser.add_argument(
+            '--compare',
+            help='Previous result file to compare against',
+        )
+
+    def get_mix(self, overrides):
+        mix = dict(DEFAULT_MIX)
+        for override in overrides:
+            name, _, weight = override.partition('=')
+            if name not in SCENARIOS:
+                raise CommandError(f'Unknown scenario: {name}')
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f'Invalid weight: {override}')
+        if not any(mix.values()):
+            raise CommandError('All scenarios are disabled')
+        return mix
+
+    def get_transport_factory(self, base_url):
+        if base_url:
+            return lambda: HttpTransport(base_url)
+        if 'testserver' not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        return InProcessTransport
+
+    def write_table(self, result):
+        self.stdout.write(
+            f'{"endpoint":<24}{"requests":>9}{"errors":>7}{"rps":>9}'
+            f'{"p50":>9}{"p95":>9}{"p99":>9}{"queries":>9}'
+        )
+        rows = list(result['endpoints'].items())
+        if result['total']:
+            rows.append(('total', result['total']))
+        for name, stats in rows:
+            latency = stats['latency_ms']
+            queries = stats['queries']['mean'] if stats['queries'] else '-'
+            self.stdout.write(
+                f'{name:<24}{stats["requests"]:>9}{stats["errors"]:>7}'
+                f'{stats["rps"]:>9}{latency["p50"]:>9}{latency["p95"]:>9}'
+                f'{latency["p99"]:>9}{queries:>9}'
+            )
+
+    def write_comparison(self, result, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                previous = json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Cannot read {path}: {error}')
+        self.stdout.write(
+            f'\nChange against {previous.get("label") or path}:'
+        )
+        for name, changes in compare(result, previous):
+            self.stdout.write(
+                f'{name:<24}'
+                + ''.join(
+                    f'{metric:>6} '
+                    + (f'{change:+8.1%}' if change is not None else '       -')
+                    for metric, change in changes.items()
+                )
+            )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('Concurrency must be positive')
+        mix = self.get_mix(options['mix'])
+        dataset = Dataset()
+        if not dataset.users or not dataset.recipe_ids:
+            raise CommandError(
+                'Benchmark data not found, run seed_benchmark_data first'
+            )
+        load_test = LoadTest(
+            dataset,
+            mix,
+            self.get_transport_factory(options['base_url']),
+            options['concurrency'],
+            duration=None if options['requests'] else options['duration'],
+            total_requests=options['requests'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+        )
+        self.stdout.write(
+            f'Running {options["concurrency"]} clients against '
+            f'{options["base_url"] or "the in-process application"}...'
+        )
+        result = {
+            'label': options['label'],
+            'started': datetime.now(timezone.utc).isoformat(),
+            'target': options['base_url'] or 'in-process',
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'response_cache': settings.RECIPE_RESPONSE_CACHE_ENABLED,
+            'concurrency': options['concurrency'],
+            'warmup_s': options['warmup'],
+            'seed': options['seed'],
+            'dataset': {
+                'users': len(dataset.users),
+                'recipes': len(dataset.recipe_ids),
+                'tags': len(dataset.tag_slugs),
+            },
+            'mix': load_test.mix,
+        }
+        result.update(load_test.run())
+        if result['total'] is None:
+            raise CommandError('No requests were measured')
+        self.write_table(result)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.write_comparison(result, options['compare'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Results written to {options["output"]}')
+        )
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.exports import (
+    claim_export,
+    cleanup_exports,
+    requeue_stale_exports,
+    run_export,
+)
+
+
+class Command(BaseCommand):
+    help = 'Render queued shopping list exports'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between queue polls',
+        )
+        parser.add_argument(
+            '--stale-timeout',
+            type=int,
+            default=300,
+            help='Seconds after which a running job is requeued',
+        )
+        parser.add_argument(
+            '--cleanup-interval',
+            type=float,
+            default=60.0,
+            help='Seconds between removals of expired exports',
+        )
+
+    def maintain(self, stale_timeout):
+        requeued = requeue_stale_exports(stale_timeout)
+        removed = cleanup_exports()
+        if requeued or removed:
+            self.stdout.write(
+                f'Requeued {requeued} stale job(s), '
+                f'removed {removed} expired export(s)'
+            )
+
+    def handle(self, *args, **kwargs):
+        last_cleanup = 0
+        while True:
+            close_old_connections()
+            if time.monotonic() - last_cleanup >= kwargs['cleanup_interval']:
+                self.maintain(kwargs['stale_timeout'])
+                last_cleanup = time.monotonic()
+            job = claim_export()
+            if job is not None:
+                job = run_export(job)
+                self.stdout.write(
+                    f'Export #{job.pk} for user #{job.user_id}: {job.status}'
+                )
+                continue
+            if kwargs['once']:
+                return
+            time.sleep(kwargs['interval'])
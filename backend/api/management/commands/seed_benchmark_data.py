@@ -0,0 +1,258 @@
+import random
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from api.loadtest import BENCHMARK_EMAIL_DOMAIN, BENCHMARK_PASSWORD
+from api.response_cache import invalidate_recipes
+from ingredients.models import Ingredient
+from ingredients.search import bump_index_version
+from recipes.aggregates import rebuild_shopping_lists
+from recipes.counters import reconcile_counters
+from recipes.feed import rebuild_feeds
+from recipes.pantry import reset_pantry_index
+from recipes.popularity import update_popularity
+from recipes.models import (
+    FavoritesListRecipe,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartRecipe,
+)
+from recipes.search import update_search_index
+from recipes.similarity import backfill_signatures
+from tags.models import Tag
+from users.models import Subscriptions
+
+
+User = get_user_model()
+
+BENCHMARK_TAG_PREFIX = 'benchmark-'
+BENCHMARK_INGREDIENT_PREFIX = 'benchmark ingredient'
+BENCHMARK_IMAGE_NAME = 'recipes_images/benchmark.jpg'
+BENCHMARK_IMAGE_SIZE = (1200, 800)
+BATCH_SIZE = 1000
+WORDS = (
+    'борщ', 'салат', 'суп', 'пирог', 'каша', 'омлет', 'рагу', 'плов',
+    'soup', 'salad', 'pie', 'stew', 'pasta', 'curry', 'pancakes', 'bread',
+)
+
+
+class Command(BaseCommand):
+    help = 'Create a synthetic dataset for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--ingredients', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=10)
+        parser.add_argument('--subscriptions-per-user', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Remove a previously seeded dataset first',
+        )
+
+    def clear(self):
+        User.objects.filter(
+            email__endswith=f'@{BENCHMARK_EMAIL_DOMAIN}'
+        ).delete()
+        Tag.objects.filter(slug__startswith=BENCHMARK_TAG_PREFIX).delete()
+        Ingredient.objects.filter(
+            name__startswith=BENCHMARK_INGREDIENT_PREFIX
+        ).delete()
+
+    def create_image(self):
+        if not default_storage.exists(BENCHMARK_IMAGE_NAME):
+            buffer = BytesIO()
+            Image.effect_noise(BENCHMARK_IMAGE_SIZE, 64).convert('RGB').save(
+                buffer, 'JPEG', quality=90
+            )
+            default_storage.save(
+                BENCHMARK_IMAGE_NAME, ContentFile(buffer.getvalue())
+            )
+
+    def create_users(self, count):
+        password = make_password(BENCHMARK_PASSWORD)
+        User.objects.bulk_create(
+            (
+                User(
+                    email=f'user{number}@{BENCHMARK_EMAIL_DOMAIN}',
+                    username=f'benchmark_user_{number}',
+                    first_name='Benchmark',
+                    last_name=f'User {number}',
+                    password=password,
+                )
+                for number in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        users = list(
+            User.objects.filter(
+                email__endswith=f'@{BENCHMARK_EMAIL_DOMAIN}'
+            ).order_by('pk')
+        )
+        Token.objects.bulk_create(
+            (Token(key=Token.generate_key(), user=user) for user in users),
+            batch_size=BATCH_SIZE,
+        )
+        return users
+
+    def create_catalog(self, tags, ingredients):
+        Tag.objects.bulk_create(
+            (
+                Tag(
+                    name=f'Benchmark {number}',
+                    slug=f'{BENCHMARK_TAG_PREFIX}{number}',
+                )
+                for number in range(tags)
+            ),
+            ignore_conflicts=True,
+        )
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=name,
+                    search_name=name.casefold(),
+                    measurement_unit=random.choice(('г', 'мл', 'шт.')),
+                )
+                for name in (
+                    f'{BENCHMARK_INGREDIENT_PREFIX} {number:05d}'
+                    for number in range(ingredients)
+                )
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        bump_index_version()
+        return (
+            list(
+                Tag.objects.filter(
+                    slug__startswith=BENCHMARK_TAG_PREFIX
+                ).values_list('pk', flat=True)
+            ),
+            list(
+                Ingredient.objects.filter(
+                    name__startswith=BENCHMARK_INGREDIENT_PREFIX
+                ).values_list('pk', flat=True)
+            ),
+        )
+
+    def create_recipes(self, users, count, tag_ids, ingredient_ids, options):
+        recipes = Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=random.choice(users),
+                    name=' '.join(random.sample(WORDS, 2)).capitalize(),
+                    text=' '.join(random.choices(WORDS, k=30)),
+                    image=BENCHMARK_IMAGE_NAME,
+                    cooking_time=random.randint(5, 180),
+                )
+                for _ in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in random.sample(
+                    tag_ids, min(len(tag_ids), random.randint(1, 3))
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe.pk,
+                    ingredient_id=ingredient_id,
+                    amount=random.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient_id in random.sample(
+                    ingredient_ids,
+                    min(
+                        len(ingredient_ids),
+                        options['ingredients_per_recipe'],
+                    ),
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        for recipe in recipes:
+            update_search_index(recipe)
+        return [recipe.pk for recipe in recipes]
+
+    def create_relations(self, users, recipe_ids, options):
+        for model, per_user in (
+            (FavoritesListRecipe, options['favorites_per_user']),
+            (ShoppingCartRecipe, options['cart_per_user']),
+        ):
+            model.objects.bulk_create(
+                (
+                    model(user=user, recipe_id=recipe_id)
+                    for user in users
+                    for recipe_id in random.sample(
+                        recipe_ids, min(per_user, len(recipe_ids))
+                    )
+                ),
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+        Subscriptions.objects.bulk_create(
+            (
+                Subscriptions(subscriber=user, subscribed_to=author)
+                for user in users
+                for author in random.sample(
+                    users,
+                    min(options['subscriptions_per_user'], len(users)),
+                )
+                if author != user
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        if options['clear']:
+            self.clear()
+        elif User.objects.filter(
+            email__endswith=f'@{BENCHMARK_EMAIL_DOMAIN}'
+        ).exists():
+            raise CommandError(
+                'Benchmark data already exists, use --clear to recreate it'
+            )
+        self.create_image()
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            tag_ids, ingredient_ids = self.create_catalog(
+                options['tags'], options['ingredients']
+            )
+            recipe_ids = self.create_recipes(
+                users, options['recipes'], tag_ids, ingredient_ids, options
+            )
+            self.create_relations(users, recipe_ids, options)
+            rebuild_shopping_lists(users)
+            reconcile_counters()
+            rebuild_feeds(users)
+            update_popularity()
+            backfill_signatures(Recipe.objects.filter(pk__in=recipe_ids))
+            invalidate_recipes(recipe_ids)
+            reset_pantry_index()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Created {len(users)} users and {len(recipe_ids)} recipes'
+            )
+        )
@@ -0,0 +1,179 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .response_cache import CACHE_HEADER
+
+
+UNRESOLVED_VIEW = 'unresolved'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+current_metrics = ContextVar('current_metrics', default=None)
+lock = Lock()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+requests_total = defaultdict(int)
+cache_results_total = defaultdict(int)
+db_time_total = defaultdict(float)
+latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+response_size = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.db_time = 0
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += perf_counter() - started
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def enable_query_recording():
+    connection_created.connect(install_query_recorder)
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(connection=connection)
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else UNRESOLVED_VIEW
+
+
+def get_response_size(response):
+    if response.streaming:
+        return int(response.get('Content-Length') or 0)
+    return len(response.content)
+
+
+def record_request(request, response, metrics):
+    duration = perf_counter() - metrics.started
+    labels = (get_view_name(request), request.method)
+    cache_result = response.get(CACHE_HEADER)
+    with lock:
+        requests_total[labels + (str(response.status_code),)] += 1
+        latency[labels].observe(duration)
+        queries[labels].observe(metrics.queries)
+        db_time_total[labels] += metrics.db_time
+        response_size[labels].observe(get_response_size(response))
+        if cache_result:
+            cache_results_total[labels + (cache_result.lower(),)] += 1
+
+
+def format_labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_histogram(name, help_text, histograms, names):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for values, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(
+            histogram.buckets + ('+Inf',), histogram.counts
+        ):
+            cumulative += count
+            lines.append(
+                f'{name}_bucket{format_labels(names, values, le=bound)} '
+                f'{cumulative}'
+            )
+        lines.append(
+            f'{name}_sum{format_labels(names, values)} {histogram.sum}'
+        )
+        lines.append(
+            f'{name}_count{format_labels(names, values)} {histogram.count}'
+        )
+    return lines
+
+
+def format_counter(name, help_text, counters, names):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    for values, value in sorted(counters.items()):
+        lines.append(f'{name}{format_labels(names, values)} {value}')
+    return lines
+
+
+def render_metrics():
+    labels = ('view', 'method')
+    with lock:
+        lines = (
+            format_counter(
+                'foodgram_http_requests_total',
+                'Requests by view, method and status.',
+                requests_total,
+                labels + ('status',),
+            )
+            + format_histogram(
+                'foodgram_http_request_duration_seconds',
+                'Request latency.',
+                latency,
+                labels,
+            )
+            + format_histogram(
+                'foodgram_db_queries_per_request',
+                'Database queries per request.',
+                queries,
+                labels,
+            )
+            + format_counter(
+                'foodgram_db_query_duration_seconds_total',
+                'Time spent in database queries.',
+                db_time_total,
+                labels,
+            )
+            + format_histogram(
+                'foodgram_http_response_size_bytes',
+                'Response body size.',
+                response_size,
+                labels,
+            )
+            + format_counter(
+                'foodgram_response_cache_total',
+                'Response cache lookups by result.',
+                cache_results_total,
+                labels + ('result',),
+            )
+        )
+    return '\n'.join(lines) + '\n'
@@ -1,9 +1,265 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import hashlib
+import json
+from functools import cached_property, partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import (
+    EmptyResultSet,
+    FieldDoesNotExist,
+    ValidationError,
+)
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 DEFAULT_PAGE_SIZE = 10
+INVALID_CURSOR_MESSAGE = 'Invalid cursor'
+COUNT_CACHE_TIMEOUT = 30
+USER_SCOPED_PARAMS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def estimate_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class SlicedPage(Page):
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class CachedCountPaginator(Paginator):
+    def __init__(self, *args, cache_key, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not items and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return SlicedPage(
+            items[:self.per_page], number, self, len(items) > self.per_page
+        )
+
+    @cached_property
+    def counted(self):
+        counted = None
+        if self.cache_key is not None:
+            counted = cache.get(self.cache_key)
+        if counted is None:
+            estimate = estimate_count(self.object_list)
+            if (
+                estimate is not None
+                and estimate >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+            ):
+                counted = (estimate, False)
+            else:
+                counted = (self.object_list.count(), True)
+            if self.cache_key is not None:
+                cache.set(self.cache_key, counted, COUNT_CACHE_TIMEOUT)
+        return counted
+
+    @cached_property
+    def count(self):
+        return self.counted[0]
+
+    @property
+    def count_exact(self):
+        return self.counted[1]
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+
+    def __init__(self, ordering, page_size):
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def encode_cursor(self, item, reverse):
+        values = [
+            getattr(item, field.lstrip('-')) for field in self.ordering
+        ]
+        cursor = json.dumps(
+            {'v': values, 'r': reverse}, default=str, separators=(',', ':')
+        )
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            base64.urlsafe_b64encode(cursor.encode()).decode(),
+        )
+
+    def decode_cursor(self, queryset, encoded):
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values, reverse = cursor['v'], bool(cursor['r'])
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self.to_python(queryset, field.lstrip('-'), value)
+                for field, value in zip(self.ordering, values)
+            ], reverse
+        except (
+            binascii.Error,
+            KeyError,
+            TypeError,
+            ValueError,
+            ValidationError,
+        ):
+            raise NotFound(INVALID_CURSOR_MESSAGE)
+
+    def to_python(self, queryset, name, value):
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+        return field.to_python(value)
+
+    def get_position_filter(self, values, reverse):
+        position = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            condition = Q(
+                **{f'{name}__{"lt" if descending else "gt"}': values[index]}
+            )
+            for previous, value in zip(self.ordering[:index], values):
+                condition &= Q(**{previous.lstrip('-'): value})
+            position |= condition
+        first = self.ordering[0]
+        descending = first.startswith('-') != reverse
+        lookup = f'{first.lstrip("-")}__{"lte" if descending else "gte"}'
+        return position & Q(**{lookup: values[0]})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), 'page'
+        )
+        encoded = request.query_params.get(self.cursor_query_param)
+        values, reverse = (
+            self.decode_cursor(queryset, encoded) if encoded else (None, False)
+        )
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering
+            ]
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(values, reverse)
+            )
+        items = list(queryset[:self.page_size + 1])
+        has_more = len(items) > self.page_size
+        items = items[:self.page_size]
+        if reverse:
+            items.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        self.next = (
+            self.encode_cursor(items[-1], False)
+            if items and has_next else None
+        )
+        self.previous = (
+            self.encode_cursor(items[0], True)
+            if items and has_previous else None
+        )
+        return items
+
+    def get_paginated_response(self, data):
+        return Response(
+            {'next': self.next, 'previous': self.previous, 'results': data}
+        )
 
 
 class CustomPaginationClass(PageNumberPagination):
     page_size = DEFAULT_PAGE_SIZE
     page_size_query_param = 'limit'
+    keyset = None
+
+    def get_count_cache_key(self, request, view):
+        ignored = (
+            self.page_query_param,
+            self.page_size_query_param,
+            KeysetPagination.cursor_query_param,
+        )
+        params = sorted(
+            (key, sorted(value.strip().lower() for value in values))
+            for key, values in request.query_params.lists()
+            if key not in ignored
+        )
+        user_scoped = getattr(view, 'count_cache_per_user', False) or any(
+            key in USER_SCOPED_PARAMS for key, _ in params
+        )
+        if user_scoped:
+            return None
+        digest = hashlib.md5(
+            json.dumps([request.path, params]).encode()
+        ).hexdigest()
+        return f'pagination_count:{digest}'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if (
+            ordering
+            and KeysetPagination.cursor_query_param in request.query_params
+        ):
+            self.keyset = KeysetPagination(
+                ordering, self.get_page_size(request)
+            )
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            cache_key=self.get_count_cache_key(request, view),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return Response(
+            {
+                'count': self.page.paginator.count,
+                'count_exact': self.page.paginator.count_exact,
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'results': data,
+            }
+        )
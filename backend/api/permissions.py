@@ -1,5 +1,10 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from rest_framework import permissions
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import (
+    BasePermission,
+    IsAuthenticatedOrReadOnly,
+)
 
 
 class IsAuthorOrReadOnly(IsAuthenticatedOrReadOnly):
@@ -8,3 +13,11 @@ class IsAuthorOrReadOnly(IsAuthenticatedOrReadOnly):
             request.method in permissions.SAFE_METHODS
             or obj.author == request.user
         )
+
+
+class CanViewMetrics(BasePermission):
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        return request.user.is_staff or bool(token) and constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+        )
@@ -0,0 +1,59 @@
+from functools import cached_property
+
+from recipes.models import FavoritesListRecipe, ShoppingCartRecipe
+from users.models import Subscriptions
+
+
+class UserRelations:
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def subscribed_ids(self):
+        return set(
+            Subscriptions.objects.filter(subscriber=self.user).values_list(
+                'subscribed_to_id', flat=True
+            )
+        )
+
+    @cached_property
+    def favorited_ids(self):
+        return set(
+            FavoritesListRecipe.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True
+            )
+        )
+
+    @cached_property
+    def shopping_cart_ids(self):
+        return set(
+            ShoppingCartRecipe.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True
+            )
+        )
+
+    def is_subscribed(self, user_id):
+        return user_id in self.subscribed_ids
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.favorited_ids
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.shopping_cart_ids
+
+
+def get_user_relations(context):
+    request = context.get('request')
+    if request is None or not request.user.is_authenticated:
+        return None
+    http_request = getattr(request, '_request', request)
+    if not hasattr(http_request, 'user_relations'):
+        http_request.user_relations = UserRelations(request.user)
+    return http_request.user_relations
+
+
+def preload_subscriptions(request):
+    relations = get_user_relations({'request': request})
+    if relations is not None:
+        relations.subscribed_ids
+    return relations
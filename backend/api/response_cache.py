@@ -0,0 +1,104 @@
+import hashlib
+from threading import Lock
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+
+LIST_GENERATION_KEY = 'recipes_response_generation'
+RECIPE_VERSION_KEY = 'recipe_response_version:{}'
+LIST_RESPONSE_KEY = 'recipes_list_response:{}:{}'
+DETAIL_RESPONSE_KEY = 'recipe_detail_response:{}:{}:{}'
+CACHE_HEADER = 'X-Cache'
+
+stats = {'hits': 0, 'misses': 0}
+stats_lock = Lock()
+
+
+def get_cache_stats():
+    with stats_lock:
+        return dict(stats)
+
+
+def record(result):
+    with stats_lock:
+        stats[result] += 1
+
+
+def get_version(key):
+    return cache.get_or_set(key, lambda: uuid4().hex, None)
+
+
+def get_query_hash(request):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+        if value != ''
+    )
+    query = f'{request.get_host()}{request.path}?{urlencode(params)}'
+    return hashlib.md5(query.encode()).hexdigest()
+
+
+def get_list_cache_key(request):
+    return LIST_RESPONSE_KEY.format(
+        get_version(LIST_GENERATION_KEY), get_query_hash(request)
+    )
+
+
+def get_detail_cache_key(request, pk):
+    return DETAIL_RESPONSE_KEY.format(
+        pk,
+        get_version(RECIPE_VERSION_KEY.format(pk)),
+        get_query_hash(request),
+    )
+
+
+def get_cached_response(request, get_key, get_response):
+    if not settings.RECIPE_RESPONSE_CACHE_ENABLED or (
+        request.user.is_authenticated
+    ):
+        return get_response()
+    key = get_key()
+    data = cache.get(key)
+    if data is not None:
+        record('hits')
+        return Response(data, headers={CACHE_HEADER: 'HIT'})
+    record('misses')
+    response = get_response()
+    if response.status_code == 200:
+        cache.set(key, response.data, settings.RECIPE_RESPONSE_CACHE_TIMEOUT)
+    response[CACHE_HEADER] = 'MISS'
+    return response
+
+
+async def aget_cached_data(request, get_key, get_data):
+    if not settings.RECIPE_RESPONSE_CACHE_ENABLED or (
+        request.user.is_authenticated
+    ):
+        return await get_data(), None
+    key = await sync_to_async(get_key)()
+    data = await cache.aget(key)
+    if data is not None:
+        record('hits')
+        return data, 'HIT'
+    record('misses')
+    data = await get_data()
+    await cache.aset(key, data, settings.RECIPE_RESPONSE_CACHE_TIMEOUT)
+    return data, 'MISS'
+
+
+def invalidate_recipes(recipe_ids, lists=True):
+    keys = [RECIPE_VERSION_KEY.format(pk) for pk in recipe_ids]
+    if lists:
+        keys.append(LIST_GENERATION_KEY)
+
+    def invalidate():
+        cache.delete_many(keys)
+
+    transaction.on_commit(invalidate)
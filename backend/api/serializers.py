@@ -1,23 +1,53 @@
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from rest_framework.validators import UniqueTogetherValidator
 
 from ingredients.models import Ingredient
 from recipes.models import (
-    FavoritesListRecipe,
     Recipe,
     RecipeIngredient,
-    ShoppingCartRecipe,
+    ShoppingListExport,
+    ShoppingListItem,
+)
+from recipes.aggregates import get_amount_changes
+from recipes.pantry import (
+    PANTRY_MAX_INGREDIENTS,
+    PANTRY_MAX_RESULTS,
+    PANTRY_RESULTS_LIMIT,
+)
+from recipes.signals import recipe_ingredients_changed
+from recipes.similarity import (
+    DUPLICATE_THRESHOLD,
+    SIMILAR_MAX_RESULTS,
+    SIMILAR_RECIPES_LIMIT,
+    find_similar_recipes,
 )
 from tags.models import Tag
-from users.models import Subscriptions
+from .bulk import BULK_MAX_ITEMS
+from .relations import get_user_relations
 
 
 User = get_user_model()
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    def to_representation(self, value):
+        request = self.context.get('request')
+        variants = {}
+        for size, formats in value.get('sizes', {}).items():
+            variants[size] = {}
+            for extension, name in formats.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[size][extension] = url
+        return variants
+
+
 class UserAvatarSerializer(serializers.ModelSerializer):
     avatar = Base64ImageField()
 
@@ -35,6 +65,7 @@ class UserAvatarSerializer(serializers.ModelSerializer):
 
 class UserListSerializer(serializers.ModelSerializer):
     avatar = Base64ImageField(required=False)
+    avatar_variants = ImageVariantsField()
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -46,75 +77,49 @@ class UserListSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'avatar',
+            'avatar_variants',
             'is_subscribed',
         )
 
     def get_is_subscribed(self, obj):
-        return bool(
-            (request := self.context.get('request'))
-            and request.user.is_authenticated
-            and request.user.subscriptions.filter(id=obj.id).exists()
-        )
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        relations = get_user_relations(self.context)
+        return bool(relations and relations.is_subscribed(obj.id))
 
 
 class SimpleRecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class DisplaySubscriptionSerializer(UserListSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta(UserListSerializer.Meta):
         fields = UserListSerializer.Meta.fields + (
             'recipes',
             'recipes_count',
+            'subscribers_count',
         )
 
     def get_recipes(self, obj):
-        recipes = obj.recipes.all()
-        recipes_limit = self.context.get('recipes_limit', None)
-        if recipes_limit is not None:
-            try:
-                recipes_limit = int(recipes_limit)
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes = obj.recipes.all()
+            recipes_limit = self.context.get('recipes_limit')
+            if recipes_limit is not None:
                 recipes = recipes[:recipes_limit]
-            except (ValueError, TypeError):
-                pass
         return SimpleRecipeSerializer(recipes, many=True, read_only=True).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
 
-
-class CreateSubscriptionSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Subscriptions
-        fields = ('subscriber', 'subscribed_to')
-
-    def validate(self, data):
-        subscriber = data.get('subscriber')
-        subscribed_to = data.get('subscribed_to')
-
-        if subscriber == subscribed_to:
-            raise ValidationError('You cannot subscribe to yourself.')
-
-        if Subscriptions.objects.filter(
-            subscriber=subscriber, subscribed_to=subscribed_to
-        ).exists():
-            raise ValidationError('You are already subscribed to this user.')
-
-        return data
-
-    def to_representation(self, instance):
-        display_serializer = DisplaySubscriptionSerializer(
-            instance.subscribed_to,
-            context=self.context,
-        )
-        return display_serializer.data
+class RecipesLimitSerializer(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(min_value=1, required=False)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -123,60 +128,20 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'slug')
 
 
-class ShoppingCartRecipeSerializer(serializers.ModelSerializer):
-    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
-
-    class Meta:
-        model = ShoppingCartRecipe
-        fields = ['user', 'recipe']
-        validators = [
-            UniqueTogetherValidator(
-                queryset=ShoppingCartRecipe.objects.all(),
-                fields=('user', 'recipe'),
-            )
-        ]
-
-    def validate_recipe(self, value):
-        user = self.context['request'].user
-        if ShoppingCartRecipe.objects.filter(user=user, recipe=value).exists():
-            raise serializers.ValidationError(
-                'Рецепт, который вы пытаетесь добавить, '
-                'уже находится в списке покупок.'
-            )
-        return value
-
-    def to_representation(self, instance):
-        return SimpleRecipeSerializer(instance.recipe).data
-
-
-class FavoritesListRecipeSerializer(serializers.ModelSerializer):
-    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
-
-    class Meta:
-        model = FavoritesListRecipe
-        fields = ['user', 'recipe']
-        validators = [
-            UniqueTogetherValidator(
-                queryset=FavoritesListRecipe.objects.all(),
-                fields=('user', 'recipe'),
-            )
-        ]
+class BulkRecipesSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+    )
 
-    def validate_recipe(self, value):
-        user = self.context['request'].user
-        if FavoritesListRecipe.objects.filter(
-            user=user, recipe=value
-        ).exists():
-            raise serializers.ValidationError(
-                'Рецепт, который вы пытаетесь добавить, '
-                'уже находится в списке избранного.'
-            )
-        return value
 
-    def to_representation(self, instance):
-        return SimpleRecipeSerializer(instance.recipe).data
+class BulkAuthorsSerializer(serializers.Serializer):
+    authors = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+    )
 
 
 class RecipeIngredientReadSerializer(serializers.ModelSerializer):
@@ -192,7 +157,7 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
@@ -202,6 +167,7 @@ class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
 class RecipeReadSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     image = Base64ImageField(read_only=True)
+    image_variants = ImageVariantsField()
     ingredients = RecipeIngredientReadSerializer(
         source='recipe_ingredient', read_only=True, many=True
     )
@@ -218,29 +184,67 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
             'is_favorited',
             'is_in_shopping_cart',
+            'favorites_count',
+            'shopping_cart_count',
         )
 
     def get_is_favorited(self, obj):
-        return bool(
-            (request := self.context.get('request'))
-            and request.user.is_authenticated
-            and FavoritesListRecipe.objects.filter(
-                user=request.user, recipe=obj
-            ).exists()
-        )
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        relations = get_user_relations(self.context)
+        return bool(relations and relations.is_favorited(obj.id))
 
     def get_is_in_shopping_cart(self, obj):
-        return bool(
-            (request := self.context.get('request'))
-            and request.user.is_authenticated
-            and ShoppingCartRecipe.objects.filter(
-                user=request.user, recipe=obj
-            ).exists()
-        )
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        relations = get_user_relations(self.context)
+        return bool(relations and relations.is_in_shopping_cart(obj.id))
+
+
+class PantryRecipeSerializer(RecipeReadSerializer):
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + ('coverage', 'missing')
+
+
+class PantryQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=PANTRY_MAX_INGREDIENTS,
+    )
+    limit = serializers.IntegerField(
+        min_value=1, max_value=PANTRY_MAX_RESULTS, default=PANTRY_RESULTS_LIMIT
+    )
+
+
+class SimilarRecipeSerializer(RecipeReadSerializer):
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + ('similarity',)
+
+
+class SimilarRecipesQuerySerializer(serializers.Serializer):
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=SIMILAR_MAX_RESULTS,
+        default=SIMILAR_RECIPES_LIMIT,
+    )
+
+
+class DuplicateRecipeSerializer(SimpleRecipeSerializer):
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(SimpleRecipeSerializer.Meta):
+        fields = SimpleRecipeSerializer.Meta.fields + ('similarity',)
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
@@ -264,6 +268,18 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('author',)
 
+    def validate_ingredients(self, ingredients):
+        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
+        found = Ingredient.objects.in_bulk(ingredient_ids)
+        missing = [str(pk) for pk in ingredient_ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(missing)}'
+            )
+        for ingredient in ingredients:
+            ingredient['id'] = found[ingredient['id']]
+        return ingredients
+
     def validate(self, data):
         ingredients = data.get('ingredients')
         if not ingredients:
@@ -300,37 +316,97 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             )
         return image
 
+    @transaction.atomic
     def create_or_update_recipe(self, instance, validated_data):
         tags = validated_data.pop('tags', [])
         ingredients_data = validated_data.pop('ingredients', [])
 
         if instance is None:
             instance = Recipe.objects.create(**validated_data)
+            existing = []
         else:
             instance = super().update(instance, validated_data)
+            existing = list(instance.recipe_ingredient.all())
 
         instance.tags.set(tags)
-
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        for ingredient_data in ingredients_data:
-            RecipeIngredient.objects.create(
-                recipe=instance,
-                ingredient=ingredient_data['id'],
-                amount=ingredient_data['amount'],
-            )
+        recipe_ingredients_changed.send(
+            sender=Recipe,
+            recipe=instance,
+            changes=self.write_ingredients(
+                instance, ingredients_data, existing
+            ),
+        )
 
         return instance
 
+    def write_ingredients(self, recipe, ingredients_data, existing):
+        amounts = {
+            ingredient_data['id'].id: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+        old_amounts, kept, to_delete = {}, {}, []
+        for recipe_ingredient in existing:
+            ingredient_id = recipe_ingredient.ingredient_id
+            old_amounts[ingredient_id] = (
+                old_amounts.get(ingredient_id, 0) + recipe_ingredient.amount
+            )
+            if ingredient_id in amounts and ingredient_id not in kept:
+                kept[ingredient_id] = recipe_ingredient
+            else:
+                to_delete.append(recipe_ingredient.pk)
+        to_update = []
+        for ingredient_id, recipe_ingredient in kept.items():
+            if recipe_ingredient.amount != amounts[ingredient_id]:
+                recipe_ingredient.amount = amounts[ingredient_id]
+                to_update.append(recipe_ingredient)
+
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in kept
+        )
+        return get_amount_changes(old_amounts, amounts)
+
     def create(self, validated_data):
-        return self.create_or_update_recipe(None, validated_data)
+        recipe = self.create_or_update_recipe(None, validated_data)
+        self.possible_duplicates = Recipe.objects.in_ranking(
+            find_similar_recipes(recipe, threshold=DUPLICATE_THRESHOLD),
+            'similarity',
+        )
+        return recipe
 
     def update(self, instance, validated_data):
         return self.create_or_update_recipe(instance, validated_data)
 
     def to_representation(self, instance):
-        return RecipeReadSerializer(
+        instance = Recipe.objects.for_read(self.context['request'].user).get(
+            pk=instance.pk
+        )
+        data = RecipeReadSerializer(
             instance, context=self.context
         ).to_representation(instance)
+        if hasattr(self, 'possible_duplicates'):
+            data['possible_duplicates'] = DuplicateRecipeSerializer(
+                self.possible_duplicates, many=True
+            ).data
+        return data
+
+
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='ingredient.id')
+    name = serializers.CharField(source='ingredient.name')
+    measurement_unit = serializers.CharField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -343,3 +419,27 @@ class IngredientSerializer(serializers.ModelSerializer):
                 fields=('name', 'measurement_unit'),
             )
         ]
+
+
+class ShoppingListExportSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ShoppingListExport
+        fields = (
+            'id',
+            'status',
+            'error',
+            'created',
+            'expires',
+            'download_url',
+        )
+
+    def get_download_url(self, obj):
+        if obj.status != ShoppingListExport.Status.DONE:
+            return None
+        return reverse(
+            'shopping_list_exports-download',
+            args=(obj.pk,),
+            request=self.context.get('request'),
+        )
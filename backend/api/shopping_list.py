@@ -0,0 +1,91 @@
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.models import ShoppingListItem
+
+
+FONT_NAME = 'Roboto-Black'
+FONT_PATH = settings.BASE_DIR / 'static' / 'Roboto-Black.ttf'
+FONT_SIZE = 12
+TITLE = 'Shopping List'
+PAGE_WIDTH, PAGE_HEIGHT = letter
+LEFT_MARGIN = 72
+TITLE_Y = 750
+FIRST_LINE_Y = 730
+TOP_LINE_Y = 750
+BOTTOM_MARGIN = 50
+LINE_HEIGHT = 20
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def lines_per_page(top):
+    return (top - BOTTOM_MARGIN) // LINE_HEIGHT + 1
+
+
+FIRST_PAGE_LINES = lines_per_page(FIRST_LINE_Y)
+PAGE_LINES = lines_per_page(TOP_LINE_Y)
+
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def get_shopping_list(user):
+    return list(
+        ShoppingListItem.objects.filter(user=user).values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
+    )
+
+
+def paginate_lines(lines):
+    pages = [lines[:FIRST_PAGE_LINES]]
+    for start in range(FIRST_PAGE_LINES, len(lines), PAGE_LINES):
+        pages.append(lines[start:start + PAGE_LINES])
+    return pages
+
+
+def render_shopping_list(items):
+    register_fonts()
+    lines = [
+        f'{name}: {total_amount}{measurement_unit}'
+        for name, measurement_unit, total_amount in items
+    ]
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter, pageCompression=1)
+    for number, page_lines in enumerate(paginate_lines(lines)):
+        if number:
+            pdf.showPage()
+        text = pdf.beginText(
+            LEFT_MARGIN, FIRST_LINE_Y if number == 0 else TOP_LINE_Y
+        )
+        text.setFont(FONT_NAME, FONT_SIZE, leading=LINE_HEIGHT)
+        if number == 0:
+            pdf.setFont(FONT_NAME, FONT_SIZE)
+            pdf.drawString(LEFT_MARGIN, TITLE_Y, TITLE)
+        text.textLines(page_lines)
+        pdf.drawText(text)
+    pdf.save()
+    return buffer.getvalue()
+
+
+def get_cache_key(user):
+    return f'shopping_list_pdf:{user.pk}:{user.shopping_cart_version}'
+
+
+def get_shopping_list_pdf(user):
+    cache_key = get_cache_key(user)
+    pdf = cache.get(cache_key)
+    if pdf is None:
+        items = get_shopping_list(user)
+        pdf = render_shopping_list(items) if items else b''
+        cache.set(cache_key, pdf, SHOPPING_LIST_CACHE_TIMEOUT)
+    return pdf or None
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from ingredients.models import Ingredient
+from recipes.models import Recipe
+from recipes.popularity import popularity_updated
+from recipes.signals import recipe_ingredients_changed, recipe_stats_changed
+from tags.models import Tag
+from .response_cache import invalidate_recipes
+
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(recipe_ingredients_changed, sender=Recipe)
+def recipe_ingredients_updated(sender, recipe, **kwargs):
+    invalidate_recipes([recipe.pk])
+
+
+@receiver(popularity_updated, sender=Recipe)
+def recipe_popularity_updated(sender, **kwargs):
+    invalidate_recipes([])
+
+
+@receiver(recipe_stats_changed, sender=Recipe)
+def recipe_stats_updated(sender, recipe_ids, **kwargs):
+    invalidate_recipes(recipe_ids, lists=False)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_recipes([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_recipes(instance.recipes.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_recipes(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    invalidate_recipes(
+        Recipe.objects.filter(tags=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_recipes(
+            Recipe.objects.filter(ingredients=instance)
+            .values_list('pk', flat=True)
+            .distinct()
+        )
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_recipes(instance.recipes.values_list('pk', flat=True))
@@ -0,0 +1,931 @@
+import base64
+import json
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from itertools import cycle
+from pathlib import Path
+from threading import Barrier
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    AsyncClient,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+
+from ingredients.models import Ingredient
+from ingredients.search import (
+    IngredientIndex,
+    IngredientSearch,
+    get_index_version,
+)
+from recipes import background
+from recipes.models import (
+    FavoritesListRecipe,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCartRecipe,
+    ShoppingListItem,
+)
+from recipes.short_links import decode_short_link, encode_short_link
+from recipes.pantry import (
+    PantryIndex,
+    PantrySearch,
+    get_state,
+    load_rows,
+    mark_recipe_changed,
+)
+from tags.models import Tag
+from users.models import Subscriptions
+from .async_views import gather_reads
+from .filters import IngredientFilter, RecipeFilter
+
+
+User = get_user_model()
+
+SMALL_RECIPE_SIZE = 5
+LARGE_RECIPE_SIZE = 40
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+PLAN_RECIPES = 2000
+PLAN_TAGS = 20
+PLAN_READERS = 20
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new('RGB', (2, 2)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def create_user(username):
+    return User.objects.create_user(
+        email=f'{username}@example.com',
+        username=username,
+        password='password',
+        first_name='Имя',
+        last_name='Фамилия',
+    )
+
+
+def create_recipes(author, count):
+    return Recipe.objects.bulk_create(
+        Recipe(
+            author=author,
+            name=f'Рецепт {index}',
+            text='Описание',
+            cooking_time=10,
+        )
+        for index in range(count)
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeWriteQueriesTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='author@example.com',
+            username='author',
+            password='password',
+            first_name='Автор',
+            last_name='Рецептов',
+        )
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', slug=f'tag-{index}') for index in range(2)
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(LARGE_RECIPE_SIZE * 2)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def get_payload(self, ingredients):
+        return {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in ingredients
+            ],
+            'tags': [tag.id for tag in self.tags],
+            'image': get_image(),
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+
+    def count_queries(self, request, expected_status):
+        with CaptureQueriesContext(connection) as context:
+            response = request()
+        self.assertEqual(response.status_code, expected_status)
+        return len(context), response
+
+    def create_recipe(self, size):
+        return self.count_queries(
+            lambda: self.client.post(
+                '/api/recipes/',
+                self.get_payload(self.ingredients[:size]),
+                format='json',
+            ),
+            status.HTTP_201_CREATED,
+        )
+
+    def update_recipe(self, size):
+        _, response = self.create_recipe(size)
+        kept = size // 2
+        payload = self.get_payload(self.ingredients[kept:kept + size])
+        payload['ingredients'][0]['amount'] = 20
+        return self.count_queries(
+            lambda: self.client.patch(
+                f'/api/recipes/{response.data["id"]}/',
+                payload,
+                format='json',
+            ),
+            status.HTTP_200_OK,
+        )
+
+    def test_create_queries_do_not_grow_with_ingredients(self):
+        small, _ = self.create_recipe(SMALL_RECIPE_SIZE)
+        large, response = self.create_recipe(LARGE_RECIPE_SIZE)
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data['ingredients']), LARGE_RECIPE_SIZE)
+
+    def test_update_queries_do_not_grow_with_ingredients(self):
+        small, _ = self.update_recipe(SMALL_RECIPE_SIZE)
+        large, response = self.update_recipe(LARGE_RECIPE_SIZE)
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data['ingredients']), LARGE_RECIPE_SIZE)
+
+
+class RecipeRelationFilterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@example.com',
+            username='reader',
+            password='password',
+            first_name='Читатель',
+            last_name='Рецептов',
+        )
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.user,
+                name=f'Рецепт {index}',
+                text='Описание',
+                cooking_time=10,
+            )
+            for index in range(3)
+        )
+        FavoritesListRecipe.objects.create(
+            user=cls.user, recipe=cls.recipes[0]
+        )
+        ShoppingCartRecipe.objects.create(
+            user=cls.user, recipe=cls.recipes[1]
+        )
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', slug=f'tag-{index}')
+            for index in range(PLAN_TAGS)
+        )
+        cls.recipes[2].tags.add(cls.tags[0])
+
+    def filter_recipes(self, **params):
+        request = APIRequestFactory().get('/api/recipes/', params)
+        request.user = self.user
+        request.query_params = request.GET
+        return RecipeFilter(
+            request.GET, queryset=Recipe.objects.all(), request=request
+        ).qs
+
+    def assert_uses_exists(self, queryset, table):
+        sql = str(queryset.query).upper()
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertNotIn(f'JOIN "{table.upper()}"', sql)
+
+    def assert_not_deduplicated(self, queryset, table):
+        if connection.vendor == 'postgresql':
+            plan = queryset.explain()
+            self.assertIn(table, plan)
+            self.assertNotIn('Unique', plan)
+            self.assertNotIn('Aggregate', plan)
+
+    def seed_plan_data(self):
+        author = create_user('planner')
+        readers = [
+            create_user(f'plan-reader-{index}')
+            for index in range(PLAN_READERS)
+        ]
+        recipes = create_recipes(author, PLAN_RECIPES)
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe, tag in zip(recipes, cycle(self.tags))
+        )
+        for model in (FavoritesListRecipe, ShoppingCartRecipe):
+            model.objects.bulk_create(
+                model(user=reader, recipe=recipe)
+                for index, reader in enumerate(readers)
+                for recipe in recipes[index::PLAN_READERS]
+            )
+        with connection.cursor() as cursor:
+            for model in (
+                Recipe,
+                Tag,
+                Recipe.tags.through,
+                FavoritesListRecipe,
+                ShoppingCartRecipe,
+            ):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    def test_relation_filters_use_exists(self):
+        for param, model, expected in (
+            ('is_favorited', FavoritesListRecipe, self.recipes[0]),
+            ('is_in_shopping_cart', ShoppingCartRecipe, self.recipes[1]),
+        ):
+            with self.subTest(param=param):
+                table = model._meta.db_table
+                queryset = self.filter_recipes(**{param: 1})
+                self.assert_uses_exists(queryset, table)
+                self.assert_not_deduplicated(queryset, table)
+                self.assertEqual(list(queryset), [expected])
+                excluded = self.filter_recipes(**{param: 0})
+                self.assert_uses_exists(excluded, table)
+                self.assert_not_deduplicated(excluded, table)
+                self.assertNotIn(expected, excluded)
+
+    def test_tags_filter_uses_exists(self):
+        self.recipes[2].tags.add(self.tags[1])
+        queryset = self.filter_recipes(tags=['TAG-0', 'tag-1'])
+        self.assert_uses_exists(queryset, Recipe.tags.through._meta.db_table)
+        self.assertEqual(list(queryset), [self.recipes[2]])
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL plans')
+    def test_filter_plans_avoid_sequential_scans(self):
+        self.seed_plan_data()
+        through_table = Recipe.tags.through._meta.db_table
+        for params, table, index in (
+            (
+                {'is_favorited': 1},
+                FavoritesListRecipe._meta.db_table,
+                'unique_user_recipe_in_favorites_list',
+            ),
+            (
+                {'is_in_shopping_cart': 1},
+                ShoppingCartRecipe._meta.db_table,
+                'unique_user_recipe_in_shopping_cart',
+            ),
+            (
+                {'tags': ['tag-0']},
+                through_table,
+                f'{through_table}_tag_recipe_idx',
+            ),
+            (
+                {'author': self.user.pk},
+                Recipe._meta.db_table,
+                'recipes_recipe_author',
+            ),
+        ):
+            with self.subTest(params=params):
+                plan = self.filter_recipes(**params).explain()
+                self.assertNotIn(f'Seq Scan on {table}', plan)
+                self.assertIn(index, plan)
+
+
+@override_settings(BACKGROUND_WORKERS=0, RECIPE_RESPONSE_CACHE_ENABLED=True)
+class RecipeResponseCacheTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('cook')
+        cls.reader = create_user('guest')
+        cls.recipe = create_recipes(cls.author, 1)[0]
+        cls.detail_url = f'/api/recipes/{cls.recipe.pk}/'
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def get(self, url):
+        response = self.anonymous.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_anonymous_responses_are_cached(self):
+        for url in ('/api/recipes/', self.detail_url):
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url)['X-Cache'], 'MISS')
+                self.assertEqual(self.get(url)['X-Cache'], 'HIT')
+        self.assertNotIn('X-Cache', self.client.get(self.detail_url))
+
+    def test_counter_change_refreshes_only_recipe_detail(self):
+        self.get(self.detail_url)
+        self.get('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{self.detail_url}favorite/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        detail = self.get(self.detail_url)
+        self.assertEqual(detail['X-Cache'], 'MISS')
+        self.assertEqual(detail.data['favorites_count'], 1)
+        self.assertEqual(self.get('/api/recipes/')['X-Cache'], 'HIT')
+
+    def test_recipe_change_refreshes_lists(self):
+        self.get('/api/recipes/')
+        self.recipe.name = 'Новое название'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.save()
+        listing = self.get('/api/recipes/')
+        self.assertEqual(listing['X-Cache'], 'MISS')
+        self.assertEqual(listing.data['results'][0]['name'], 'Новое название')
+
+
+class IngredientSearchIndexTest(TestCase):
+    def test_ingredient_changes_bump_index_version(self):
+        version = get_index_version()
+        ingredient = Ingredient.objects.create(
+            name='Абрикос', measurement_unit='г'
+        )
+        created_version = get_index_version()
+        self.assertGreater(created_version, version)
+        ingredient.delete()
+        self.assertGreater(get_index_version(), created_version)
+
+    def test_stale_index_is_rebuilt(self):
+        search = IngredientSearch()
+        search.index = IngredientIndex(
+            get_index_version(), [(1, 'Абрикос', 'г'), (2, 'Апельсин', 'шт.')]
+        )
+        self.assertEqual(
+            search.search('абр'),
+            [{'id': 1, 'name': 'Абрикос', 'measurement_unit': 'г'}],
+        )
+        Ingredient.objects.create(name='Абрикосы', measurement_unit='г')
+        with mock.patch.object(search, 'schedule_build') as schedule_build:
+            self.assertIsNone(search.search('абр'))
+        schedule_build.assert_called_once_with(get_index_version())
+
+    def test_name_filter_folds_cyrillic_case(self):
+        apricot, orange = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Абрикос', 'Апельсин')
+        )
+        orange.name = 'Абрикосовый джем'
+        orange.save(update_fields=['name'])
+        for value in ('абр', 'АБРИКОС'):
+            with self.subTest(value=value):
+                self.assertEqual(
+                    list(
+                        IngredientFilter(
+                            {'name': value}, queryset=Ingredient.objects.all()
+                        ).qs
+                    ),
+                    [apricot, orange],
+                )
+
+
+class PantryIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipes = create_recipes(create_user('pantry'), 2)
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Продукт {index}', measurement_unit='г')
+            for index in range(3)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe, ingredient in zip(cls.recipes, cls.ingredients)
+        )
+
+    def test_recipe_changes_are_logged_in_database(self):
+        generation, changes = get_state()
+        mark_recipe_changed(self.recipes[0].pk)
+        self.assertEqual(get_state(), (generation, changes + 1))
+
+    def test_loaded_index_is_patched_from_change_log(self):
+        search = PantrySearch()
+        search.index = PantryIndex.build(*get_state(), load_rows())
+        added = self.ingredients[2]
+        self.assertEqual(search.rank([added.pk]), [])
+        RecipeIngredient.objects.create(
+            recipe=self.recipes[0], ingredient=added, amount=1
+        )
+        mark_recipe_changed(self.recipes[0].pk)
+        with mock.patch.object(search, 'schedule_build') as schedule_build:
+            ranking = search.rank([added.pk])
+        schedule_build.assert_not_called()
+        self.assertEqual(ranking, [(self.recipes[0].pk, 0.5, 1)])
+
+
+class ImportIngredientsTest(TestCase):
+    def import_file(self, name, content):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / name
+            path.write_text(content, encoding='utf-8')
+            output = StringIO()
+            call_command('import_ingredients', str(path), stdout=output)
+        return output.getvalue()
+
+    def assert_imported(self, output, expected):
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', 'measurement_unit')),
+            expected,
+        )
+        self.assertEqual(
+            set(Ingredient.objects.values_list('search_name', flat=True)),
+            {name.casefold() for name, _ in expected},
+        )
+        self.assertIn(
+            f'Inserted {len(expected)}, skipped 3 (invalid 2)', output
+        )
+
+    def test_csv(self):
+        output = self.import_file(
+            'ingredients.csv',
+            'Абрикос,г\nМука,г\nАбрикос,г\nбез единицы\n,кг\n',
+        )
+        self.assert_imported(output, {('Абрикос', 'г'), ('Мука', 'г')})
+
+    def test_json_accepts_only_objects_and_pairs(self):
+        output = self.import_file(
+            'ingredients.json',
+            json.dumps(
+                [
+                    {'name': 'Абрикос', 'measurement_unit': 'г'},
+                    ['Мука', 'г'],
+                    ['Мука', 'г'],
+                    'ab',
+                    ['Соль', 'г', 'лишнее'],
+                ]
+            ),
+        )
+        self.assert_imported(output, {('Абрикос', 'г'), ('Мука', 'г')})
+
+    def test_json_lines(self):
+        output = self.import_file(
+            'ingredients.jsonl',
+            '{"name": "Абрикос", "measurement_unit": "г"}\n'
+            '["Мука", "г"]\n["Мука", "г"]\n"ab"\n{broken\n',
+        )
+        self.assert_imported(output, {('Абрикос', 'г'), ('Мука', 'г')})
+
+
+class BulkOperationsTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('bulk')
+        cls.author = create_user('writer')
+        cls.recipes = create_recipes(cls.author, 2)
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Продукт {index}', measurement_unit='г')
+            for index in range(2)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for recipe in cls.recipes
+            for ingredient in cls.ingredients
+        )
+        cls.recipe_ids = [recipe.pk for recipe in cls.recipes]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def change(self, method, url, **data):
+        response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {
+            result['id']: result['status']
+            for result in response.data['results']
+        }
+
+    def get_counters(self, field):
+        return list(
+            Recipe.objects.filter(pk__in=self.recipe_ids)
+            .order_by('pk')
+            .values_list(field, flat=True)
+        )
+
+    def get_shopping_list(self):
+        return dict(
+            ShoppingListItem.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'amount'
+            )
+        )
+
+    def test_shopping_cart_side_effects_are_applied_once(self):
+        url = '/api/recipes/shopping_cart/'
+        self.assertEqual(
+            self.change('post', url, recipes=[self.recipe_ids[0], 999999]),
+            {self.recipe_ids[0]: 'created', 999999: 'not_found'},
+        )
+        self.assertEqual(
+            self.change('post', url, recipes=self.recipe_ids),
+            {self.recipe_ids[0]: 'exists', self.recipe_ids[1]: 'created'},
+        )
+        self.assertEqual(self.get_counters('shopping_cart_count'), [1, 1])
+        self.assertEqual(
+            self.get_shopping_list(),
+            {ingredient.pk: 20 for ingredient in self.ingredients},
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.shopping_cart_version, 2)
+        self.assertEqual(
+            self.change('delete', url, recipes=[self.recipe_ids[0], 999999]),
+            {self.recipe_ids[0]: 'deleted', 999999: 'missing'},
+        )
+        self.assertEqual(self.get_counters('shopping_cart_count'), [0, 1])
+        self.assertEqual(
+            self.get_shopping_list(),
+            {ingredient.pk: 10 for ingredient in self.ingredients},
+        )
+
+    def test_favorites_counters(self):
+        url = '/api/recipes/favorite/'
+        self.change('post', url, recipes=self.recipe_ids)
+        self.change('post', url, recipes=self.recipe_ids)
+        self.assertEqual(self.get_counters('favorites_count'), [1, 1])
+        self.change('delete', url, recipes=self.recipe_ids)
+        self.assertEqual(self.get_counters('favorites_count'), [0, 0])
+        self.assertFalse(
+            FavoritesListRecipe.objects.filter(user=self.user).exists()
+        )
+
+    def test_subscriptions(self):
+        url = '/api/users/subscribe/'
+        self.assertEqual(
+            self.change(
+                'post', url, authors=[self.author.pk, self.user.pk, 999999]
+            ),
+            {
+                self.author.pk: 'created',
+                self.user.pk: 'self_subscription',
+                999999: 'not_found',
+            },
+        )
+        self.assertEqual(
+            self.change('post', url, authors=[self.author.pk]),
+            {self.author.pk: 'exists'},
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
+        self.assertEqual(
+            self.change('delete', url, authors=[self.author.pk]),
+            {self.author.pk: 'deleted'},
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 0)
+
+    def test_single_recipe_endpoints(self):
+        recipe_id = self.recipe_ids[0]
+        url = f'/api/recipes/{recipe_id}/shopping_cart/'
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['id'], recipe_id)
+        self.assertEqual(
+            self.client.post(url).status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(
+            self.client.post('/api/recipes/999999/shopping_cart/').status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+        self.assertEqual(self.get_counters('shopping_cart_count'), [1, 0])
+        self.assertEqual(
+            self.get_shopping_list(),
+            {ingredient.pk: 10 for ingredient in self.ingredients},
+        )
+        self.assertEqual(
+            self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT
+        )
+        self.assertEqual(
+            self.client.delete(url).status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(
+            self.client.delete(
+                '/api/recipes/999999/shopping_cart/'
+            ).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+        self.assertEqual(self.get_counters('shopping_cart_count'), [0, 0])
+        self.assertEqual(self.get_shopping_list(), {})
+
+    def test_single_subscription_endpoints(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['id'], self.author.pk)
+        self.assertEqual(len(response.data['recipes']), 2)
+        for url, expected in (
+            (url, status.HTTP_400_BAD_REQUEST),
+            (
+                f'/api/users/{self.user.pk}/subscribe/',
+                status.HTTP_400_BAD_REQUEST,
+            ),
+            ('/api/users/999999/subscribe/', status.HTTP_404_NOT_FOUND),
+        ):
+            self.assertEqual(self.client.post(url).status_code, expected)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        self.assertEqual(
+            self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT
+        )
+        self.assertEqual(
+            self.client.delete(url).status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 0)
+
+    def test_stale_instances_do_not_overwrite_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe_ids[0])
+        author = User.objects.get(pk=self.author.pk)
+        self.client.post(f'/api/recipes/{recipe.pk}/favorite/')
+        self.client.post(f'/api/users/{author.pk}/subscribe/')
+        recipe.name = 'Новое название'
+        recipe.save()
+        author.first_name = 'Новое'
+        author.save()
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(author.first_name, 'Новое')
+        self.assertEqual(author.subscribers_count, 1)
+
+
+@override_settings(
+    BACKGROUND_WORKERS=0,
+    RECIPE_RESPONSE_CACHE_ENABLED=False,
+    ROOT_URLCONF='foodgram.asgi_urls',
+)
+class AsyncViewsTest(TransactionTestCase):
+    def setUp(self):
+        self.user = create_user('async')
+        self.author = create_user('async-author')
+        self.recipes = create_recipes(self.author, 3)
+        Subscriptions.objects.create(
+            subscriber=self.user, subscribed_to=self.author
+        )
+        self.token = Token.objects.create(user=self.user)
+        cache.clear()
+
+    def get_both(self, url, **headers):
+        async_response = async_to_sync(AsyncClient().get)(
+            url, headers=headers
+        )
+        with override_settings(ROOT_URLCONF='foodgram.urls'):
+            sync_response = self.client.get(url, headers=headers)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.json(), sync_response.json())
+        return async_response
+
+    def test_reads_match_sync_views(self):
+        for headers in ({}, {'Authorization': f'Token {self.token.key}'}):
+            with self.subTest(headers=headers):
+                response = self.get_both('/api/recipes/?limit=2', **headers)
+                self.assertEqual(response.json()['count'], 3)
+                self.assertEqual(len(response.json()['results']), 2)
+                recipe = self.get_both(
+                    f'/api/recipes/{self.recipes[0].pk}/', **headers
+                ).json()
+                self.assertEqual(
+                    recipe['author']['is_subscribed'], bool(headers)
+                )
+                self.get_both('/api/recipes/999999/', **headers)
+                self.get_both('/api/recipes/?page=9', **headers)
+
+    def test_short_links(self):
+        recipe = self.recipes[0]
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(
+            short_link='abc12'
+        )
+        for code, expected in (
+            (encode_short_link(recipe.pk), f'/recipes/{recipe.pk}/'),
+            ('abc12', f'/recipes/{self.recipes[1].pk}/'),
+            (encode_short_link(999999), None),
+            ('zzzzz', None),
+        ):
+            with self.subTest(code=code):
+                response = async_to_sync(AsyncClient().get)(f'/s/{code}')
+                if expected is None:
+                    self.assertEqual(
+                        response.status_code, status.HTTP_404_NOT_FOUND
+                    )
+                else:
+                    self.assertRedirects(
+                        response, expected, fetch_redirect_response=False
+                    )
+
+    def test_independent_reads_run_concurrently(self):
+        barrier = Barrier(2, timeout=5)
+        results = async_to_sync(gather_reads)(barrier.wait, barrier.wait)
+        self.assertEqual(sorted(results), [0, 1])
+
+
+class BackgroundTasksTest(TestCase):
+    @override_settings(BACKGROUND_WORKERS=1)
+    def test_task_errors_are_logged(self):
+        def fail():
+            raise RuntimeError('broken image')
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        with mock.patch.object(background, 'executor', executor):
+            with self.assertLogs(background.logger, 'ERROR') as logs:
+                with self.captureOnCommitCallbacks(execute=True):
+                    background.run_in_background(fail)
+                executor.shutdown(wait=True)
+        self.assertIn('broken image', logs.output[0])
+
+
+class ShortLinkTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipes = create_recipes(create_user('linker'), 2)
+
+    def test_codes_round_trip(self):
+        for pk in (1, 61, 62**6 - 1, 62**6, 10**12):
+            with self.subTest(pk=pk):
+                code = encode_short_link(pk)
+                self.assertGreaterEqual(len(code), 6)
+                self.assertEqual(decode_short_link(code), pk)
+        for code in ('abc12', 'abc-12'):
+            with self.subTest(code=code):
+                self.assertIsNone(decode_short_link(code))
+
+    def test_redirect_requires_existing_recipe(self):
+        recipe, legacy = self.recipes
+        Recipe.objects.filter(pk=legacy.pk).update(short_link='abc12')
+        link = self.client.get(f'/api/recipes/{recipe.pk}/get-link/').data
+        code = link['short-link'].rsplit('/', 1)[1]
+        self.assertEqual(code, encode_short_link(recipe.pk))
+        for code, expected in (
+            (code, f'/recipes/{recipe.pk}/'),
+            ('abc12', f'/recipes/{legacy.pk}/'),
+        ):
+            with self.subTest(code=code):
+                self.assertRedirects(
+                    self.client.get(f'/s/{code}'),
+                    expected,
+                    fetch_redirect_response=False,
+                )
+        recipe_id = legacy.pk
+        legacy.delete()
+        for code in (encode_short_link(recipe_id), 'abc12', 'zzzzz'):
+            with self.subTest(code=code):
+                self.assertEqual(
+                    self.client.get(f'/s/{code}').status_code,
+                    status.HTTP_404_NOT_FOUND,
+                )
+
+
+class KeysetPaginationTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipes = create_recipes(create_user('pager'), 7)
+
+    def walk(self, url, link):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data[link]
+        return ids, response.data
+
+    def test_cursor_pages_follow_list_order(self):
+        expected = list(
+            Recipe.objects.order_by('-created', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        ids, last_page = self.walk('/api/recipes/?cursor=&limit=3', 'next')
+        self.assertEqual(ids, expected)
+        previous = self.client.get(last_page['previous']).data
+        self.assertEqual(
+            [recipe['id'] for recipe in previous['results']], expected[3:6]
+        )
+        self.assertEqual(
+            self.walk(previous['previous'], 'previous')[0], expected[:3]
+        )
+
+    def test_new_recipes_do_not_shift_pages(self):
+        first = self.client.get('/api/recipes/?cursor=&limit=3').data
+        create_recipes(self.recipes[0].author, 2)
+        second = self.client.get(first['next']).data
+        self.assertEqual(
+            [recipe['id'] for recipe in second['results']],
+            [recipe.pk for recipe in self.recipes[3::-1][:3]],
+        )
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', 'eyJ2IjpbXX0='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/recipes/?cursor={cursor}')
+                self.assertEqual(
+                    response.status_code, status.HTTP_404_NOT_FOUND
+                )
+
+
+class CounterReconcileTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('counted')
+        cls.reader = create_user('counter')
+        cls.recipe = create_recipes(cls.author, 1)[0]
+        FavoritesListRecipe.objects.create(user=cls.reader, recipe=cls.recipe)
+        Subscriptions.objects.create(
+            subscriber=cls.reader, subscribed_to=cls.author
+        )
+
+    def reconcile(self, *args):
+        output = StringIO()
+        call_command('reconcile_counters', *args, stdout=output)
+        return output.getvalue()
+
+    def test_drift_is_reported_and_repaired(self):
+        Recipe.objects.update(favorites_count=5, shopping_cart_count=2)
+        User.objects.filter(pk=self.author.pk).update(
+            recipes_count=0, subscribers_count=3
+        )
+        output = self.reconcile('--verify')
+        self.assertIn('recipes.Recipe.favorites_count: 1 row(s)', output)
+        self.assertIn('users.FoodgramUser.recipes_count: 1 row(s)', output)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 5)
+        self.assertIn('Repaired 4 counter value(s)', self.reconcile())
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(
+            (self.recipe.favorites_count, self.recipe.shopping_cart_count),
+            (1, 0),
+        )
+        self.assertEqual(
+            (self.author.recipes_count, self.author.subscribers_count),
+            (1, 1),
+        )
+        self.assertIn('Repaired 0 counter value(s)', self.reconcile())
+
+
+class ShoppingListRebuildTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('shopper')
+        cls.recipes = create_recipes(create_user('supplier'), 2)
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=cls.ingredient, amount=5
+            )
+            for recipe in cls.recipes
+        )
+        for recipe in cls.recipes:
+            ShoppingCartRecipe.objects.create(user=cls.user, recipe=recipe)
+
+    def rebuild(self, *args):
+        output = StringIO()
+        call_command('rebuild_shopping_lists', *args, stdout=output)
+        return output.getvalue()
+
+    def get_amounts(self):
+        return dict(
+            ShoppingListItem.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'amount'
+            )
+        )
+
+    def test_cart_changes_keep_aggregate_in_sync(self):
+        self.assertEqual(self.get_amounts(), {self.ingredient.pk: 10})
+        ShoppingCartRecipe.objects.filter(recipe=self.recipes[0]).delete()
+        self.assertEqual(self.get_amounts(), {self.ingredient.pk: 5})
+        self.recipes[1].delete()
+        self.assertEqual(self.get_amounts(), {})
+        self.assertIn('Shopping lists are in sync', self.rebuild('--verify'))
+
+    def test_drift_is_reported_and_repaired(self):
+        ShoppingListItem.objects.filter(user=self.user).update(amount=1)
+        self.assertIn('1 shopping list(s) drifted', self.rebuild('--verify'))
+        self.assertEqual(self.get_amounts(), {self.ingredient.pk: 1})
+        version = User.objects.get(pk=self.user.pk).shopping_cart_version
+        self.assertIn('Rebuilt 1 shopping list(s)', self.rebuild())
+        self.assertEqual(self.get_amounts(), {self.ingredient.pk: 10})
+        self.assertGreater(
+            User.objects.get(pk=self.user.pk).shopping_cart_version, version
+        )
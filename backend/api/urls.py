@@ -1,7 +1,14 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from .views import (
+    IngredientViewSet,
+    RecipeViewSet,
+    ShoppingListExportViewSet,
+    TagViewSet,
+    UserViewSet,
+    metrics,
+)
 
 
 router = DefaultRouter()
@@ -9,9 +16,15 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('tags', TagViewSet, basename='tags')
 router.register('users', UserViewSet, basename='users')
+router.register(
+    'shopping_list_exports',
+    ShoppingListExportViewSet,
+    basename='shopping_list_exports',
+)
 
 
 urlpatterns = [
+    path('_metrics', metrics, name='metrics'),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,47 +1,104 @@
+from functools import partial
 from io import BytesIO
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db.models import F, Prefetch, Value
 from django.http import FileResponse, HttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
-from rest_framework import status, viewsets
-from rest_framework.decorators import action
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
 from ingredients.models import Ingredient
+from ingredients.search import SEARCH_RESULTS_LIMIT, ingredient_search
+from recipes.feed import filter_feed
 from recipes.models import (
     FavoritesListRecipe,
     Recipe,
-    RecipeIngredient,
     ShoppingCartRecipe,
+    ShoppingListExport,
+    ShoppingListItem,
 )
+from recipes.pantry import pantry_search, rank_recipes_in_db
+from recipes.popularity import POPULAR_ORDERING
+from recipes.short_links import decode_short_link
+from recipes.similarity import find_similar_recipes
 from tags.models import Tag
-from users.models import Subscriptions
-from .filters import IngredientFilter, RecipeFilter
+from .bulk import (
+    EXISTS,
+    MISSING,
+    NOT_FOUND,
+    SELF_SUBSCRIPTION,
+    add_recipes,
+    remove_recipes,
+    subscribe_to_authors,
+    unsubscribe_from_authors,
+)
+from .exports import EMPTY_CART_ERROR, enqueue_export
+from .filters import POPULAR, IngredientFilter, RecipeFilter
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
 from .pagination import CustomPaginationClass
-from .permissions import IsAuthorOrReadOnly
+from .permissions import CanViewMetrics, IsAuthorOrReadOnly
+from .response_cache import (
+    get_cached_response,
+    get_detail_cache_key,
+    get_list_cache_key,
+)
 from .serializers import (
-    CreateSubscriptionSerializer,
+    BulkAuthorsSerializer,
+    BulkRecipesSerializer,
     DisplaySubscriptionSerializer,
-    FavoritesListRecipeSerializer,
     IngredientSerializer,
+    PantryQuerySerializer,
+    PantryRecipeSerializer,
     RecipeReadSerializer,
+    RecipesLimitSerializer,
     RecipeWriteSerializer,
-    ShoppingCartRecipeSerializer,
+    SimilarRecipeSerializer,
+    SimilarRecipesQuerySerializer,
+    ShoppingListExportSerializer,
+    ShoppingListItemSerializer,
+    SimpleRecipeSerializer,
     TagSerializer,
     UserAvatarSerializer,
 )
+from .shopping_list import get_shopping_list_pdf
 
 
 User = get_user_model()
 
+ASYNC_EXPORT_VALUES = ('1', 'true')
+NOT_SUBSCRIBED_ERROR = 'You are not subscribed to this user.'
+SUBSCRIBE_ERRORS = {
+    SELF_SUBSCRIPTION: 'You cannot subscribe to yourself.',
+    EXISTS: 'You are already subscribed to this user.',
+}
+SHOPPING_CART_EXISTS_ERROR = (
+    'Рецепт, который вы пытаетесь добавить, уже находится в списке покупок.'
+)
+SHOPPING_CART_MISSING_ERROR = (
+    'Рецепт, который вы пытаетесь удалить, не находится в списке покупок.'
+)
+FAVORITES_EXISTS_ERROR = (
+    'Рецепт, который вы пытаетесь добавить, уже находится в списке избранного.'
+)
+FAVORITES_MISSING_ERROR = (
+    'Рецепт, который вы пытаетесь удалить, не находится в списке избранного.'
+)
+
+
+def get_lookup_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise NotFound
+
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
@@ -51,6 +108,8 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
 class UserViewSet(DjoserUserViewSet):
     queryset = User.objects.all()
     pagination_class = CustomPaginationClass
+    cursor_ordering = None
+    count_cache_per_user = False
 
     def get_permissions(self):
         if self.action in ('list', 'create', 'retrieve', 'get_token'):
@@ -81,16 +140,46 @@ class UserViewSet(DjoserUserViewSet):
         user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, serializer_class=DisplaySubscriptionSerializer)
+    def get_recipes_limit(self):
+        serializer = RecipesLimitSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data.get('recipes_limit')
+
+    def get_authors_with_recipes(self, recipes_limit):
+        recipes = Recipe.objects.only(
+            'id',
+            'name',
+            'image',
+            'image_variants',
+            'cooking_time',
+            'author_id',
+        )
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+        return User.objects.annotate(
+            is_subscribed=Value(True)
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        )
+
+    @action(
+        detail=False,
+        serializer_class=DisplaySubscriptionSerializer,
+        cursor_ordering=('subscription_id',),
+        count_cache_per_user=True,
+    )
     def subscriptions(self, request):
-        recipes_limit = request.query_params.get('recipes_limit', None)
-        subscriptions = Subscriptions.objects.filter(
-            subscriber=request.user
-        ).select_related('subscribed_to')
-        page = self.paginate_queryset(subscriptions)
+        recipes_limit = self.get_recipes_limit()
+        authors = (
+            self.get_authors_with_recipes(recipes_limit)
+            .filter(subscribers__subscriber=request.user)
+            .annotate(subscription_id=F('subscribers__id'))
+            .order_by('subscription_id')
+        )
+        page = self.paginate_queryset(authors)
 
         serializer = DisplaySubscriptionSerializer(
-            [sub.subscribed_to for sub in page],
+            page,
             many=True,
             context={'request': request, 'recipes_limit': recipes_limit},
         )
@@ -98,37 +187,62 @@ class UserViewSet(DjoserUserViewSet):
 
     @action(detail=True, methods=['post'])
     def subscribe(self, request, id=None):
-        recipes_limit = request.query_params.get('recipes_limit', None)
-        subscriber = request.user
-        subscribed_to = get_object_or_404(User, pk=id)
-
-        subscription_data = {
-            'subscriber': subscriber.id,
-            'subscribed_to': subscribed_to.id,
-        }
-        serializer = CreateSubscriptionSerializer(
-            data=subscription_data,
-            context={
-                'request': request,
-                'recipes_limit': recipes_limit,
-            },
+        recipes_limit = self.get_recipes_limit()
+        author_id = get_lookup_id(id)
+        [result] = subscribe_to_authors(request.user, [author_id])
+        if result['status'] == NOT_FOUND:
+            raise NotFound
+        if result['status'] in SUBSCRIBE_ERRORS:
+            return Response(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        SUBSCRIBE_ERRORS[result['status']]
+                    ]
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        author = self.get_authors_with_recipes(recipes_limit).get(
+            pk=author_id
         )
+        return Response(
+            DisplaySubscriptionSerializer(
+                author,
+                context={'request': request, 'recipes_limit': recipes_limit},
+            ).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='subscribe',
+        url_name='subscribe-bulk',
+    )
+    def subscribe_bulk(self, request):
+        serializer = BulkAuthorsSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        change = (
+            subscribe_to_authors
+            if request.method == 'POST'
+            else unsubscribe_from_authors
+        )
+        return Response(
+            {
+                'results': change(
+                    request.user, serializer.validated_data['authors']
+                )
+            }
+        )
 
     @subscribe.mapping.delete
     def unsubscribe(self, request, id=None):
-        subscriber = request.user
-        subscribed_to = get_object_or_404(User, pk=id)
-
-        deleted_count, _ = Subscriptions.objects.filter(
-            subscriber=subscriber, subscribed_to=subscribed_to
-        ).delete()
-
-        if not deleted_count:
+        author_id = get_lookup_id(id)
+        [result] = unsubscribe_from_authors(request.user, [author_id])
+        if result['status'] == MISSING:
+            if not User.objects.filter(pk=author_id).exists():
+                raise NotFound
             return Response(
-                {'error': 'You are not subscribed to this user.'},
+                {'error': NOT_SUBSCRIBED_ERROR},
                 status=status.HTTP_400_BAD_REQUEST,
             )
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -139,135 +253,226 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = CustomPaginationClass
     filterset_class = RecipeFilter
     permission_classes = (IsAuthorOrReadOnly,)
+    cursor_ordering = ('-created', '-id')
+    count_cache_per_user = False
+
+    def get_queryset(self):
+        if self.action in ['list', 'retrieve', 'feed', 'popular']:
+            return Recipe.objects.for_read(self.request.user)
+        return super().get_queryset()
 
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'feed', 'popular']:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def list(self, request, *args, **kwargs):
+        return get_cached_response(
+            request,
+            lambda: get_list_cache_key(request),
+            partial(super().list, request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return get_cached_response(
+            request,
+            lambda: get_detail_cache_key(request, kwargs['pk']),
+            partial(super().retrieve, request, *args, **kwargs),
+        )
+
+    def paginate_queryset(self, queryset):
+        if self.action == 'popular' or (
+            self.action == 'list'
+            and self.request.query_params.get('ordering') == POPULAR
+        ):
+            self.cursor_ordering = POPULAR_ORDERING
+        return super().paginate_queryset(queryset)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     @action(detail=False)
-    def download_shopping_cart(self, request):
-        pdfmetrics.registerFont(
-            TTFont('Roboto-Black', 'static/Roboto-Black.ttf')
-        )
+    def popular(self, request):
+        def get_response():
+            queryset = self.filter_queryset(self.get_queryset()).order_by(
+                *POPULAR_ORDERING
+            )
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
 
-        user = request.user
-        print(0)
-        shopping_list_result = (
-            RecipeIngredient.objects.filter(recipe__shopping_cart__user=user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(total_amount=Sum('amount'))
+        return get_cached_response(
+            request, lambda: get_list_cache_key(request), get_response
         )
-        print(1)
 
-        shopping_list_dict = {
-            item['ingredient__name']: {
-                'amount': item['total_amount'],
-                'measurement_unit': item['ingredient__measurement_unit'],
-            }
-            for item in shopping_list_result
-        }
-        print(2)
-        if not shopping_list_dict:
-            return HttpResponse('Your shopping cart is empty.', status=400)
-
-        buffer = BytesIO()
-        pdf = canvas.Canvas(buffer, pagesize=letter)
-
-        pdf.setFont('Roboto-Black', 12)
-        pdf.drawString(72, 750, 'Shopping List')
-
-        y = 730
-        for ingredient, details in shopping_list_dict.items():
-            pdf.drawString(
-                72,
-                y,
-                (
-                    f'{ingredient}: {details["amount"]}'
-                    f'{details["measurement_unit"]}'
-                ),
-            )
-            y -= 20
-            if y < 50:
-                pdf.showPage()
-                y = 750
-
-        pdf.save()
-        buffer.seek(0)
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        count_cache_per_user=True,
+    )
+    def feed(self, request):
+        queryset = filter_feed(
+            self.filter_queryset(self.get_queryset()), request.user
+        ).order_by('-created', '-id')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-        response = FileResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_cart.pdf"'
+    @action(detail=False)
+    def pantry(self, request):
+        query = PantryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        ingredient_ids = query.validated_data['ingredients']
+        limit = query.validated_data['limit']
+        ranking = pantry_search.rank(ingredient_ids, limit)
+        if ranking is None:
+            ranking = rank_recipes_in_db(ingredient_ids, limit)
+        results = Recipe.objects.for_read(request.user).in_ranking(
+            ranking, 'coverage', 'missing'
+        )
+        return Response(
+            PantryRecipeSerializer(
+                results, many=True, context=self.get_serializer_context()
+            ).data
         )
-        return response
 
-    @action(detail=True, methods=['post'])
-    def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        serializer = ShoppingCartRecipeSerializer(
-            data={'recipe': recipe.id}, context={'request': request}
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        query = SimilarRecipesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        ranking = find_similar_recipes(
+            self.get_object(), limit=query.validated_data['limit']
+        )
+        results = Recipe.objects.for_read(request.user).in_ranking(
+            ranking, 'similarity'
+        )
+        return Response(
+            SimilarRecipeSerializer(
+                results, many=True, context=self.get_serializer_context()
+            ).data
         )
 
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def download_shopping_cart(self, request):
+        if request.query_params.get('async') in ASYNC_EXPORT_VALUES:
+            if not ShoppingListItem.objects.filter(user=request.user).exists():
+                return HttpResponse(EMPTY_CART_ERROR, status=400)
+            job = enqueue_export(request.user)
+            return Response(
+                ShoppingListExportSerializer(
+                    job, context={'request': request}
+                ).data,
+                status=status.HTTP_202_ACCEPTED,
+            )
 
-    @shopping_cart.mapping.delete
-    def delete_from_shopping_cart(self, request, pk=None):
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
+        pdf = get_shopping_list_pdf(request.user)
+        if pdf is None:
+            return HttpResponse(EMPTY_CART_ERROR, status=400)
 
-        deleted_count, _ = ShoppingCartRecipe.objects.filter(
-            user=user, recipe=recipe
-        ).delete()
+        return FileResponse(
+            BytesIO(pdf),
+            as_attachment=True,
+            filename='shopping_cart.pdf',
+            content_type='application/pdf',
+        )
 
-        if not deleted_count:
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def shopping_list(self, request):
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient')
+        return Response(ShoppingListItemSerializer(items, many=True).data)
+
+    def add_recipe(self, model, pk, exists_error):
+        recipe_id = get_lookup_id(pk)
+        [result] = add_recipes(model, self.request.user, [recipe_id])
+        if result['status'] == NOT_FOUND:
+            raise NotFound
+        if result['status'] == EXISTS:
             return Response(
-                {
-                    'error': 'Рецепт, который вы пытаетесь удалить, '
-                    'не находится в списке покупок.'
-                },
+                {'recipe': [exists_error]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        recipe = Recipe.objects.only(*SimpleRecipeSerializer.Meta.fields).get(
+            pk=recipe_id
+        )
+        return Response(
+            SimpleRecipeSerializer(recipe).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    def remove_recipe(self, model, pk, missing_error):
+        recipe_id = get_lookup_id(pk)
+        [result] = remove_recipes(model, self.request.user, [recipe_id])
+        if result['status'] == MISSING:
+            if not Recipe.objects.filter(pk=recipe_id).exists():
+                raise NotFound
+            return Response(
+                {'error': missing_error},
                 status=status.HTTP_400_BAD_REQUEST,
             )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post'])
-    def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        serializer = FavoritesListRecipeSerializer(
-            data={'recipe': recipe.id}, context={'request': request}
+    def shopping_cart(self, request, pk=None):
+        return self.add_recipe(
+            ShoppingCartRecipe, pk, SHOPPING_CART_EXISTS_ERROR
         )
 
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    @shopping_cart.mapping.delete
+    def delete_from_shopping_cart(self, request, pk=None):
+        return self.remove_recipe(
+            ShoppingCartRecipe, pk, SHOPPING_CART_MISSING_ERROR
+        )
+
+    @action(detail=True, methods=['post'])
+    def favorite(self, request, pk=None):
+        return self.add_recipe(
+            FavoritesListRecipe, pk, FAVORITES_EXISTS_ERROR
+        )
 
     @favorite.mapping.delete
     def delete_from_favorite_list(self, request, pk=None):
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
+        return self.remove_recipe(
+            FavoritesListRecipe, pk, FAVORITES_MISSING_ERROR
+        )
 
-        deleted_count, _ = FavoritesListRecipe.objects.filter(
-            user=user, recipe=recipe
-        ).delete()
+    def change_recipes_in_bulk(self, request, model):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = add_recipes if request.method == 'POST' else remove_recipes
+        return Response(
+            {
+                'results': change(
+                    model, request.user, serializer.validated_data['recipes']
+                )
+            }
+        )
 
-        if not deleted_count:
-            return Response(
-                {
-                    'error': 'Рецепт, который вы пытаетесь удалить, '
-                    'не находится в списке избранного.'
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        return Response(status=status.HTTP_204_NO_CONTENT)
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_bulk(self, request):
+        return self.change_recipes_in_bulk(request, ShoppingCartRecipe)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_bulk(self, request):
+        return self.change_recipes_in_bulk(request, FavoritesListRecipe)
 
     @action(detail=True, url_path='get-link')
     def get_link(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        short_link = recipe.short_link
+        recipe = get_object_or_404(Recipe.objects.only('short_link'), pk=pk)
+        short_link = recipe.get_short_link()
 
         return Response(
             {'short-link': request.build_absolute_uri(f'/s/{short_link}')}
@@ -275,13 +480,63 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
 
 def redirect_to_recipe(request, short_link):
-    recipe = get_object_or_404(Recipe, short_link=short_link)
+    recipe_id = decode_short_link(short_link)
+    lookup = (
+        {'short_link': short_link} if recipe_id is None else {'pk': recipe_id}
+    )
+    recipe = get_object_or_404(Recipe.objects.only('id'), **lookup)
     redirect_url = f'/recipes/{recipe.id}/'
     return redirect(redirect_url)
 
 
+@api_view(['GET'])
+@permission_classes([CanViewMetrics])
+def metrics(request):
+    if not settings.METRICS_ENABLED:
+        raise NotFound
+    return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+
+class ShoppingListExportViewSet(
+    mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
+    serializer_class = ShoppingListExportSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return ShoppingListExport.objects.filter(user=self.request.user)
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ShoppingListExport.Status.DONE:
+            return Response(
+                self.get_serializer(job).data, status=status.HTTP_409_CONFLICT
+            )
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename='shopping_cart.pdf',
+            content_type='application/pdf',
+        )
+
+
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.query_params.get('name'):
+            queryset = queryset[:SEARCH_RESULTS_LIMIT]
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            results = ingredient_search.search(name)
+            if results is not None:
+                return Response(results)
+        return super().list(request, *args, **kwargs)
@@ -0,0 +1,31 @@
+from django.urls import path
+
+from api import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+
+urlpatterns = [
+    path('api/recipes/', async_views.recipe_list, name='recipes-list'),
+    path(
+        'api/recipes/<int:pk>/',
+        async_views.recipe_detail,
+        name='recipes-detail',
+    ),
+    path(
+        'api/ingredients/',
+        async_views.ingredient_list,
+        name='ingredients-list',
+    ),
+    path(
+        'api/ingredients/<int:pk>/',
+        async_views.ingredient_detail,
+        name='ingredients-detail',
+    ),
+    path('api/tags/', async_views.tag_list, name='tags-list'),
+    path('api/tags/<int:pk>/', async_views.tag_detail, name='tags-detail'),
+    path(
+        's/<str:short_link>',
+        async_views.redirect_to_recipe,
+        name='redirect_to_recipe',
+    ),
+] + sync_urlpatterns
@@ -1,29 +1,189 @@
 import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
-from ingredients.models import Ingredient
+from ingredients.models import (
+    MAX_INGREDIENT_LENGTH,
+    MAX_MEASUREMENT_UNIT_LENGTH,
+    Ingredient,
+)
+from ingredients.search import bump_index_version
+
+
+DEFAULT_BATCH_SIZE = 1000
+STAGING_TABLE = 'ingredients_import'
+INVALID_ROW = ()
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as csvfile:
+        yield from csv.reader(csvfile)
+
+
+def parse_json_item(item):
+    if isinstance(item, dict):
+        return item.get('name'), item.get('measurement_unit')
+    if isinstance(item, (list, tuple)) and len(item) == 2:
+        return tuple(item)
+    return INVALID_ROW
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as jsonfile:
+        items = json.load(jsonfile)
+    if not isinstance(items, list):
+        raise CommandError('JSON file must contain a list of ingredients')
+    for item in items:
+        yield parse_json_item(item)
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as jsonfile:
+        for line in jsonfile:
+            if not line.strip():
+                continue
+            try:
+                yield parse_json_item(json.loads(line))
+            except json.JSONDecodeError:
+                yield INVALID_ROW
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'jsonl': read_jsonl}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
 
 class Command(BaseCommand):
-    help = 'Import ingredients from a CSV file'
+    help = (
+        'Import ingredients from a CSV, JSON or JSON Lines file. CSV and '
+        'JSON Lines are streamed, a JSON file is loaded into memory whole.'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
-            'csv_file', type=str, help='The path to the CSV file'
+            'file', type=str, help='The path to the CSV, JSON or JSONL file'
+        )
+        parser.add_argument(
+            '--format',
+            choices=tuple(READERS),
+            help='File format, detected from the extension by default',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of rows inserted per statement',
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Do not use COPY on PostgreSQL',
         )
 
     def handle(self, *args, **kwargs):
-        csv_file_path = kwargs['csv_file']
-
-        with open(csv_file_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            for row in reader:
-                name, measurement_unit = row
-                Ingredient.objects.get_or_create(
-                    name=name, measurement_unit=measurement_unit
-                )
+        path = Path(kwargs['file'])
+        file_format = kwargs['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Unsupported file format: {file_format}')
+        if kwargs['batch_size'] < 1:
+            raise CommandError('Batch size must be positive')
 
+        self.read = self.invalid = 0
+        rows = self.unique_rows(READERS[file_format](path))
+        started = perf_counter()
+        with transaction.atomic():
+            if connection.vendor == 'postgresql' and not kwargs['no_copy']:
+                inserted = self.copy_rows(rows, kwargs['batch_size'])
+            else:
+                inserted = self.insert_rows(rows, kwargs['batch_size'])
+            if inserted:
+                bump_index_version()
+        elapsed = perf_counter() - started
+
+        self.stdout.write(
+            f'Read {self.read} rows in {elapsed:.2f}s '
+            f'({self.read / elapsed if elapsed else 0:.0f} rows/sec)'
+        )
         self.stdout.write(
-            self.style.SUCCESS('Successfully imported ingredients')
+            self.style.SUCCESS(
+                f'Inserted {inserted}, skipped {self.read - inserted} '
+                f'(invalid {self.invalid})'
+            )
         )
+
+    def unique_rows(self, rows):
+        seen = set()
+        for row in rows:
+            self.read += 1
+            if len(row) != 2 or not all(
+                isinstance(value, str) and value.strip() for value in row
+            ):
+                self.invalid += 1
+                continue
+            name, measurement_unit = (value.strip() for value in row)
+            if (
+                len(name) > MAX_INGREDIENT_LENGTH
+                or len(measurement_unit) > MAX_MEASUREMENT_UNIT_LENGTH
+            ):
+                self.invalid += 1
+                continue
+            if (name, measurement_unit) in seen:
+                continue
+            seen.add((name, measurement_unit))
+            yield name, measurement_unit
+
+    def insert_rows(self, rows, batch_size):
+        count_before = Ingredient.objects.count()
+        for batch in batched(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(
+                        name=name,
+                        search_name=name.casefold(),
+                        measurement_unit=measurement_unit,
+                    )
+                    for name, measurement_unit in batch
+                ),
+                ignore_conflicts=True,
+            )
+        return Ingredient.objects.count() - count_before
+
+    def copy_rows(self, rows, batch_size):
+        table = Ingredient._meta.db_table
+        copy_sql = f'COPY {STAGING_TABLE} FROM STDIN WITH (FORMAT csv)'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {STAGING_TABLE} '
+                '(name text, search_name text, measurement_unit text) '
+                'ON COMMIT DROP'
+            )
+            for batch in batched(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(
+                    (name, name.casefold(), measurement_unit)
+                    for name, measurement_unit in batch
+                )
+                buffer.seek(0)
+                if hasattr(cursor, 'copy_expert'):
+                    cursor.copy_expert(copy_sql, buffer)
+                else:
+                    with cursor.copy(copy_sql) as copy:
+                        copy.write(buffer.getvalue())
+            cursor.execute(
+                f'INSERT INTO {table} (name, search_name, measurement_unit) '
+                'SELECT name, search_name, measurement_unit '
+                f'FROM {STAGING_TABLE} '
+                'ON CONFLICT ON CONSTRAINT unique_name_measurement_unit '
+                'DO NOTHING'
+            )
+            return cursor.rowcount
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:26
+
+from django.db import migrations, models
+
+
+INDEX_VERSION_ID = 1
+
+
+def create_index_version(apps, schema_editor):
+    apps.get_model('ingredients', 'IngredientIndexVersion').objects.get_or_create(
+        pk=INDEX_VERSION_ID
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients', '0002_ingredient_name_prefix_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientIndexVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Версия индекса ингредиентов',
+                'verbose_name_plural': 'Версии индекса ингредиентов',
+            },
+        ),
+        migrations.RunPython(
+            create_index_version, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.6 on 2026-10-18 04:05
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+OLD_INDEX_NAME = 'ingredients_name_lower_prefix_idx'
+
+
+def fill_search_names(apps, schema_editor):
+    Ingredient = apps.get_model('ingredients', 'Ingredient')
+    ingredients = []
+    for ingredient in Ingredient.objects.only('name').iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        ingredient.search_name = ingredient.name.casefold()
+        ingredients.append(ingredient)
+    Ingredient.objects.bulk_update(
+        ingredients, ['search_name'], batch_size=BATCH_SIZE
+    )
+
+
+def drop_old_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {OLD_INDEX_NAME}')
+
+
+def create_old_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {OLD_INDEX_NAME} '
+        'ON ingredients_ingredient (lower(name) text_pattern_ops)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients', '0003_ingredientindexversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=128, verbose_name='Название для поиска'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_search_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['search_name'], name='ingredient_search_name_idx', opclasses=('varchar_pattern_ops',)),
+        ),
+        migrations.RunPython(drop_old_prefix_index, create_old_prefix_index),
+    ]
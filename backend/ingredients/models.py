@@ -4,10 +4,16 @@ from django.db.models import UniqueConstraint
 
 MAX_INGREDIENT_LENGTH = 128
 MAX_MEASUREMENT_UNIT_LENGTH = 64
+INDEX_VERSION_ID = 1
 
 
 class Ingredient(models.Model):
     name = models.CharField('Ингредиент', max_length=MAX_INGREDIENT_LENGTH)
+    search_name = models.CharField(
+        'Название для поиска',
+        max_length=MAX_INGREDIENT_LENGTH,
+        editable=False,
+    )
     measurement_unit = models.CharField(
         'Единица измерения', max_length=MAX_MEASUREMENT_UNIT_LENGTH
     )
@@ -22,6 +28,29 @@ class Ingredient(models.Model):
                 name='unique_name_measurement_unit',
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('search_name',),
+                name='ingredient_search_name_idx',
+                opclasses=('varchar_pattern_ops',),
+            )
+        ]
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # Case-folded in Python: SQLite's lower() only handles ASCII.
+        self.search_name = self.name.casefold()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        super().save(*args, **kwargs)
+
+
+class IngredientIndexVersion(models.Model):
+    version = models.PositiveBigIntegerField('Версия', default=0)
+
+    class Meta:
+        verbose_name = 'Версия индекса ингредиентов'
+        verbose_name_plural = 'Версии индекса ингредиентов'
@@ -0,0 +1,92 @@
+import threading
+from bisect import bisect_left
+
+from django.db import connection
+from django.db.models import F
+
+from .models import INDEX_VERSION_ID, Ingredient, IngredientIndexVersion
+
+
+SEARCH_RESULTS_LIMIT = 100
+
+
+def get_index_version():
+    return (
+        IngredientIndexVersion.objects.filter(pk=INDEX_VERSION_ID)
+        .values_list('version', flat=True)
+        .first()
+        or 0
+    )
+
+
+def bump_index_version():
+    versions = IngredientIndexVersion.objects.filter(pk=INDEX_VERSION_ID)
+    if not versions.update(version=F('version') + 1):
+        IngredientIndexVersion.objects.get_or_create(
+            pk=INDEX_VERSION_ID, defaults={'version': 1}
+        )
+
+
+class IngredientIndex:
+    def __init__(self, version, ingredients):
+        self.version = version
+        self.entries = sorted(
+            (name.casefold(), name, measurement_unit, pk)
+            for pk, name, measurement_unit in ingredients
+        )
+        self.keys = [entry[0] for entry in self.entries]
+
+    def search(self, prefix, limit=SEARCH_RESULTS_LIMIT):
+        prefix = prefix.casefold()
+        start = bisect_left(self.keys, prefix)
+        results = []
+        for key, name, measurement_unit, pk in self.entries[
+            start:start + limit
+        ]:
+            if not key.startswith(prefix):
+                break
+            results.append(
+                {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            )
+        return results
+
+
+class IngredientSearch:
+    def __init__(self):
+        self.index = None
+        self.lock = threading.Lock()
+        self.building = False
+
+    def build(self, version):
+        try:
+            index = IngredientIndex(
+                version,
+                Ingredient.objects.order_by().values_list(
+                    'id', 'name', 'measurement_unit'
+                ),
+            )
+            if get_index_version() == version:
+                self.index = index
+        finally:
+            self.building = False
+            connection.close()
+
+    def schedule_build(self, version):
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+        threading.Thread(
+            target=self.build, args=(version,), daemon=True
+        ).start()
+
+    def search(self, prefix, limit=SEARCH_RESULTS_LIMIT):
+        version = get_index_version()
+        index = self.index
+        if index is None or index.version != version:
+            self.schedule_build(version)
+            return None
+        return index.search(prefix, limit)
+
+
+ingredient_search = IngredientSearch()
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
-from .models import Recipe, RecipeIngredient
+from .aggregates import get_amount_changes
+from .models import Recipe, RecipeIngredient, ShoppingListExport
+from .signals import recipe_ingredients_changed
 
 
 AMOUNT_OF_INGREDIENTS_TO_ADD = 3
@@ -14,16 +16,40 @@ class RecipeIngredientInline(admin.TabularInline):
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author__username')
+    list_display = (
+        'name',
+        'author__username',
+        'favorites_count',
+        'shopping_cart_count',
+        'popularity',
+    )
     search_fields = ('author__username', 'name')
     list_filter = ('tags__slug',)
-    readonly_fields = ('favorites_count',)
+    readonly_fields = ('favorites_count', 'shopping_cart_count', 'popularity')
+    list_select_related = ('author',)
     inlines = [RecipeIngredientInline]
 
-    def favorites_count(self, obj):
-        return obj.users_who_favorited_this.count()
-
-    favorites_count.short_description = 'Favorites count'
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        old_amounts = recipe.ingredient_amounts() if change else {}
+        super().save_related(request, form, formsets, change)
+        recipe_ingredients_changed.send(
+            sender=Recipe,
+            recipe=recipe,
+            changes=get_amount_changes(
+                old_amounts, recipe.ingredient_amounts()
+            ),
+        )
 
 
 admin.site.register(Recipe, RecipeAdmin)
+
+
+class ShoppingListExportAdmin(admin.ModelAdmin):
+    list_display = ('user', 'status', 'created', 'expires')
+    list_filter = ('status',)
+    list_select_related = ('user',)
+    readonly_fields = ('cart_version', 'started')
+
+
+admin.site.register(ShoppingListExport, ShoppingListExportAdmin)
@@ -0,0 +1,111 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import RecipeIngredient, ShoppingListItem
+
+
+User = get_user_model()
+
+
+def get_amount_changes(old_amounts, new_amounts):
+    changes = {}
+    for ingredient_id in old_amounts.keys() | new_amounts.keys():
+        delta = new_amounts.get(ingredient_id, 0) - old_amounts.get(
+            ingredient_id, 0
+        )
+        if delta:
+            changes[ingredient_id] = delta
+    return changes
+
+
+def get_recipes_amounts(recipe_ids):
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .values_list('ingredient_id')
+        .annotate(total_amount=Sum('amount'))
+        .order_by()
+    )
+
+
+def negate_amounts(amounts):
+    return {
+        ingredient_id: -amount for ingredient_id, amount in amounts.items()
+    }
+
+
+@transaction.atomic
+def apply_shopping_list_changes(user_ids, changes):
+    user_ids = sorted(set(user_ids))
+    if not user_ids or not changes:
+        return
+    list(
+        User.objects.select_for_update()
+        .filter(pk__in=user_ids)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    items = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=changes
+        )
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, delta in changes.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > 0:
+                    to_create.append(
+                        ShoppingListItem(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=delta,
+                        )
+                    )
+                continue
+            item.amount += delta
+            if item.amount > 0:
+                to_update.append(item)
+            else:
+                to_delete.append(item.pk)
+    ShoppingListItem.objects.bulk_create(to_create)
+    ShoppingListItem.objects.bulk_update(to_update, ['amount'])
+    ShoppingListItem.objects.filter(pk__in=to_delete).delete()
+
+
+def compute_shopping_lists(users):
+    expected = defaultdict(dict)
+    for user_id, ingredient_id, amount in (
+        RecipeIngredient.objects.filter(recipe__shopping_cart__user__in=users)
+        .values_list('recipe__shopping_cart__user', 'ingredient')
+        .annotate(total_amount=Sum('amount'))
+        .order_by()
+    ):
+        expected[user_id][ingredient_id] = amount
+    return expected
+
+
+def find_shopping_list_drift(users):
+    expected = compute_shopping_lists(users)
+    stored = defaultdict(dict)
+    for user_id, ingredient_id, amount in ShoppingListItem.objects.filter(
+        user__in=users
+    ).values_list('user_id', 'ingredient_id', 'amount'):
+        stored[user_id][ingredient_id] = amount
+    drift = {}
+    for user_id in expected.keys() | stored.keys():
+        changes = get_amount_changes(stored[user_id], expected[user_id])
+        if changes:
+            drift[user_id] = changes
+    return drift
+
+
+def rebuild_shopping_lists(users):
+    drift = find_shopping_list_drift(users)
+    for user_id, changes in drift.items():
+        apply_shopping_list_changes([user_id], changes)
+    return drift
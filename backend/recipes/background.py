@@ -0,0 +1,33 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+
+logger = logging.getLogger(__name__)
+executor = ThreadPoolExecutor(
+    max_workers=max(settings.BACKGROUND_WORKERS, 1),
+    thread_name_prefix='foodgram-background',
+)
+
+
+def run_and_close_connections(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        # Nobody waits on the returned future, so the error is only logged.
+        logger.exception('Background task %r failed', func)
+    finally:
+        connections.close_all()
+
+
+def run_in_background(func, *args, **kwargs):
+    if not settings.BACKGROUND_WORKERS:
+        transaction.on_commit(lambda: func(*args, **kwargs))
+        return
+    transaction.on_commit(
+        lambda: executor.submit(
+            run_and_close_connections, func, *args, **kwargs
+        )
+    )
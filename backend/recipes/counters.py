@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Subscriptions
+from .models import FavoritesListRecipe, Recipe, ShoppingCartRecipe
+
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoritesListRecipe, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCartRecipe, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscriptions, 'subscribed_to'),
+)
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+def reconcile_counters(fix=True):
+    drift = {}
+    for model, counter, counted_model, field in COUNTERS:
+        actual = count_subquery(counted_model, field)
+        drifted = (
+            model.objects.annotate(actual=actual)
+            .exclude(**{counter: F('actual')})
+            .values('pk')
+        )
+        drift[f'{model._meta.label}.{counter}'] = drifted.count()
+        if fix:
+            model.objects.filter(pk__in=drifted).update(**{counter: actual})
+    return drift
@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+from users.models import Subscriptions
+from .models import FeedEntry, Recipe
+
+
+FEED_BATCH_SIZE = 1000
+FEED_BACKFILL_LIMIT = 200
+
+
+def is_pulled(author):
+    return author.subscribers_count > settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def create_entries(user_ids, recipes):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id, recipe_id=recipe_id, author_id=author_id
+            )
+            for user_id in user_ids
+            for recipe_id, author_id in recipes
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_recipe(recipe_id):
+    recipe = (
+        Recipe.objects.select_related('author')
+        .only('author__subscribers_count')
+        .filter(pk=recipe_id)
+        .first()
+    )
+    if recipe is None or is_pulled(recipe.author):
+        return
+    subscriber_ids = Subscriptions.objects.filter(
+        subscribed_to_id=recipe.author_id
+    ).values_list('subscriber_id', flat=True)
+    batch = []
+    for subscriber_id in subscriber_ids.iterator(chunk_size=FEED_BATCH_SIZE):
+        batch.append(subscriber_id)
+        if len(batch) == FEED_BATCH_SIZE:
+            create_entries(batch, [(recipe.pk, recipe.author_id)])
+            batch = []
+    create_entries(batch, [(recipe.pk, recipe.author_id)])
+
+
+def backfill_feed(user_id, author_id):
+    subscription = (
+        Subscriptions.objects.select_related('subscribed_to')
+        .only('subscribed_to__subscribers_count')
+        .filter(subscriber_id=user_id, subscribed_to_id=author_id)
+        .first()
+    )
+    if subscription is None or is_pulled(subscription.subscribed_to):
+        return
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        '-created', '-id'
+    )[:FEED_BACKFILL_LIMIT]
+    create_entries([user_id], recipes.values_list('pk', 'author_id'))
+
+
+def trim_feed(user_id, *author_ids):
+    FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+
+
+def rebuild_feeds(users):
+    removed, _ = (
+        FeedEntry.objects.filter(user__in=users)
+        .exclude(
+            Exists(
+                Subscriptions.objects.filter(
+                    subscriber=OuterRef('user'),
+                    subscribed_to=OuterRef('author'),
+                )
+            )
+        )
+        .delete()
+    )
+    subscriptions = Subscriptions.objects.filter(
+        subscriber__in=users
+    ).values_list('subscriber_id', 'subscribed_to_id')
+    count = 0
+    for user_id, author_id in subscriptions.iterator(
+        chunk_size=FEED_BATCH_SIZE
+    ):
+        backfill_feed(user_id, author_id)
+        count += 1
+    return count, removed
+
+
+def filter_feed(queryset, user):
+    condition = Q(
+        pk__in=FeedEntry.objects.filter(user=user).values('recipe_id')
+    )
+    pulled_author_ids = list(
+        Subscriptions.objects.filter(
+            subscriber=user,
+            subscribed_to__subscribers_count__gt=(
+                settings.FEED_FANOUT_MAX_FOLLOWERS
+            ),
+        ).values_list('subscribed_to_id', flat=True)
+    )
+    if pulled_author_ids:
+        condition |= Q(author_id__in=pulled_author_ids)
+    return queryset.filter(condition)
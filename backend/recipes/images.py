@@ -0,0 +1,89 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+DERIVATIVES_DIR = 'derivatives'
+RECIPE_IMAGE_SIZES = {'thumbnail': (480, 480), 'detail': (1280, 1280)}
+AVATAR_IMAGE_SIZES = {'avatar': (256, 256)}
+IMAGE_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+BACKGROUND_COLOR = (255, 255, 255)
+
+
+def get_derivative_name(name, size, extension):
+    stem, _ = os.path.splitext(name)
+    return f'{DERIVATIVES_DIR}/{stem}_{size}.{extension}'
+
+
+def get_derivative_names(variants):
+    return {
+        name
+        for formats in variants.get('sizes', {}).values()
+        for name in formats.values()
+    }
+
+
+def derivatives_outdated(instance, field, variants_field):
+    source = getattr(instance, field).name or ''
+    return (getattr(instance, variants_field) or {}).get('source') != source
+
+
+def open_image(field_file, sizes):
+    with field_file.open('rb'):
+        image = Image.open(field_file)
+        image.draft('RGB', max(sizes.values()))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, BACKGROUND_COLOR)
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_derivatives(field_file, sizes):
+    image = open_image(field_file, sizes)
+    storage = field_file.storage
+    derivatives = {}
+    for size, bounds in sizes.items():
+        resized = image.copy()
+        resized.thumbnail(bounds, Image.Resampling.LANCZOS)
+        derivatives[size] = {}
+        for extension, image_format, options in IMAGE_FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+            name = get_derivative_name(field_file.name, size, extension)
+            storage.delete(name)
+            derivatives[size][extension] = storage.save(
+                name, ContentFile(buffer.getvalue())
+            )
+    return derivatives
+
+
+def update_derivatives(
+    model, pk, field, variants_field, sizes, force=False
+):
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not (
+        force or derivatives_outdated(instance, field, variants_field)
+    ):
+        return False
+    field_file = getattr(instance, field)
+    old_variants = getattr(instance, variants_field) or {}
+    variants = {
+        'source': field_file.name or '',
+        'sizes': render_derivatives(field_file, sizes) if field_file else {},
+    }
+    setattr(instance, variants_field, variants)
+    instance.save(update_fields=[variants_field])
+    for name in get_derivative_names(old_variants) - get_derivative_names(
+        variants
+    ):
+        field_file.storage.delete(name)
+    return True
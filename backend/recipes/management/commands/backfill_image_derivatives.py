@@ -0,0 +1,94 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.background import run_and_close_connections
+from recipes.images import (
+    AVATAR_IMAGE_SIZES,
+    RECIPE_IMAGE_SIZES,
+    derivatives_outdated,
+    update_derivatives,
+)
+from recipes.models import Recipe
+
+
+User = get_user_model()
+
+TARGETS = {
+    'recipes': (Recipe, 'image', 'image_variants', RECIPE_IMAGE_SIZES),
+    'avatars': (User, 'avatar', 'avatar_variants', AVATAR_IMAGE_SIZES),
+}
+
+
+class Command(BaseCommand):
+    help = 'Generate resized copies of recipe photos and user avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            choices=TARGETS,
+            help='Process only recipe photos or only avatars',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of images processed in parallel',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate copies that are already up to date',
+        )
+
+    def get_pending(self, model, field, variants_field, force):
+        rows = (
+            model.objects.exclude(**{field: ''})
+            .exclude(**{f'{field}__isnull': True})
+            .only('pk', field, variants_field)
+            .order_by('pk')
+            .iterator()
+        )
+        return [
+            row.pk
+            for row in rows
+            if force or derivatives_outdated(row, field, variants_field)
+        ]
+
+    def handle(self, *args, **kwargs):
+        targets = [kwargs['only']] if kwargs['only'] else list(TARGETS)
+        force = kwargs['force']
+        with ThreadPoolExecutor(max_workers=kwargs['workers']) as executor:
+            for target in targets:
+                model, field, variants_field, sizes = TARGETS[target]
+                futures = {
+                    executor.submit(
+                        run_and_close_connections,
+                        update_derivatives,
+                        model,
+                        pk,
+                        field,
+                        variants_field,
+                        sizes,
+                        force,
+                    ): pk
+                    for pk in self.get_pending(
+                        model, field, variants_field, force
+                    )
+                }
+                processed = failed = 0
+                for future in as_completed(futures):
+                    try:
+                        processed += future.result()
+                    except Exception as error:
+                        failed += 1
+                        self.stderr.write(
+                            f'{target} #{futures[future]}: {error}'
+                        )
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'{target}: {processed} processed, {failed} failed'
+                    )
+                )
@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.feed import rebuild_feeds
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Backfill subscription feeds and remove stale entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email', type=str, help='Only process the given user'
+        )
+
+    def handle(self, *args, **kwargs):
+        users = User.objects.all()
+        if kwargs['email']:
+            users = users.filter(email=kwargs['email'])
+
+        subscriptions, removed = rebuild_feeds(users)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Backfilled {subscriptions} subscription(s), '
+                f'removed {removed} stale feed entries'
+            )
+        )
@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.aggregates import find_shopping_list_drift, rebuild_shopping_lists
+from recipes.signals import bump_shopping_cart_version
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the aggregated shopping lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email', type=str, help='Only process the given user'
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report drift without fixing it',
+        )
+
+    def handle(self, *args, **kwargs):
+        users = User.objects.all()
+        if kwargs['email']:
+            users = users.filter(email=kwargs['email'])
+
+        if kwargs['verify']:
+            drift = find_shopping_list_drift(users)
+        else:
+            drift = rebuild_shopping_lists(users)
+            bump_shopping_cart_version(User.objects.filter(pk__in=drift))
+
+        for user_id, changes in drift.items():
+            self.stdout.write(
+                f'User {user_id}: {len(changes)} ingredient(s) out of sync'
+            )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Shopping lists are in sync'))
+        elif kwargs['verify']:
+            self.stdout.write(
+                self.style.WARNING(f'{len(drift)} shopping list(s) drifted')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'Rebuilt {len(drift)} shopping list(s)')
+            )
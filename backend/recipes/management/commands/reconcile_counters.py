@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Repair drift in denormalized favorites, cart and user counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report drift without fixing it',
+        )
+
+    def handle(self, *args, **kwargs):
+        drift = reconcile_counters(fix=not kwargs['verify'])
+        for counter, count in drift.items():
+            self.stdout.write(f'{counter}: {count} row(s) drifted')
+        if kwargs['verify']:
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Repaired {sum(drift.values())} counter value(s)'
+            )
+        )
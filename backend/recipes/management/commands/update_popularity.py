@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from recipes.popularity import update_popularity
+
+
+class Command(BaseCommand):
+    help = 'Recompute time-decayed recipe popularity scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Keep running and recompute every given number of seconds',
+        )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            close_old_connections()
+            updated = update_popularity()
+            self.stdout.write(f'Updated popularity of {updated} recipe(s)')
+            if not kwargs['interval']:
+                return
+            time.sleep(kwargs['interval'])
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.similarity import backfill_signatures
+
+
+class Command(BaseCommand):
+    help = 'Recompute MinHash signatures and LSH buckets of recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Only process recipes without a signature',
+        )
+
+    def handle(self, *args, **kwargs):
+        recipes = Recipe.objects.all()
+        if kwargs['missing']:
+            recipes = recipes.filter(minhash__isnull=True)
+
+        updated = backfill_signatures(recipes)
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated signatures of {updated} recipe(s)')
+        )
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-18 02:11
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def populate_shopping_list_items(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id, amount=amount
+        )
+        for user_id, ingredient_id, amount in (
+            RecipeIngredient.objects.filter(
+                recipe__shopping_cart__isnull=False
+            )
+            .values_list('recipe__shopping_cart__user', 'ingredient')
+            .annotate(total_amount=Sum('amount'))
+            .order_by()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            populate_shopping_list_items, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.6 on 2026-10-18 02:20
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'FavoritesListRecipe', 'recipe'),
+    (
+        'recipes',
+        'Recipe',
+        'shopping_cart_count',
+        'ShoppingCartRecipe',
+        'recipe',
+    ),
+    ('users', 'FoodgramUser', 'recipes_count', 'Recipe', 'author'),
+    (
+        'users',
+        'FoodgramUser',
+        'subscribers_count',
+        'Subscriptions',
+        'subscribed_to',
+    ),
+)
+
+
+def populate_counters(apps, schema_editor):
+    for app_label, model_name, counter, counted_name, field in COUNTERS:
+        model = apps.get_model(app_label, model_name)
+        counted_app = 'users' if counted_name == 'Subscriptions' else 'recipes'
+        counted_model = apps.get_model(counted_app, counted_name)
+        model.objects.update(
+            **{
+                counter: Coalesce(
+                    Subquery(
+                        counted_model.objects.filter(
+                            **{field: OuterRef('pk')}
+                        )
+                        .order_by()
+                        .values(field)
+                        .annotate(count=Count('pk'))
+                        .values('count')
+                    ),
+                    0,
+                )
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_favorites_count_recipe_shopping_cart_count'),
+        ('users', '0003_foodgramuser_recipes_count_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
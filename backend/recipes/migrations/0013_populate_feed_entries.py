@@ -0,0 +1,45 @@
+# Generated by Django 5.1.6 on 2026-10-18 02:45
+
+from django.conf import settings
+from django.db import migrations
+
+
+FEED_BATCH_SIZE = 1000
+FEED_BACKFILL_LIMIT = 200
+
+
+def populate_feed_entries(apps, schema_editor):
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscriptions = apps.get_model('users', 'Subscriptions')
+    subscriptions = Subscriptions.objects.filter(
+        subscribed_to__subscribers_count__lte=(
+            settings.FEED_FANOUT_MAX_FOLLOWERS
+        )
+    ).values_list('subscriber_id', 'subscribed_to_id')
+    for user_id, author_id in subscriptions.iterator():
+        recipe_ids = Recipe.objects.filter(author_id=author_id).order_by(
+            '-created', '-id'
+        ).values_list('pk', flat=True)[:FEED_BACKFILL_LIMIT]
+        FeedEntry.objects.bulk_create(
+            (
+                FeedEntry(
+                    user_id=user_id, recipe_id=recipe_id, author_id=author_id
+                )
+                for recipe_id in recipe_ids
+            ),
+            batch_size=FEED_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_feedentry'),
+        ('users', '0003_foodgramuser_recipes_count_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_feed_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-18 02:46
+
+from django.db import migrations
+from django.db.models import F
+
+
+FAVORITE_WEIGHT = 2.0
+SHOPPING_CART_WEIGHT = 1.0
+
+
+def populate_popularity(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(
+        popularity=(
+            F('favorites_count') * FAVORITE_WEIGHT
+            + F('shopping_cart_count') * SHOPPING_CART_WEIGHT
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_popularity'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:27
+
+from django.db import migrations, models
+
+
+PANTRY_STATE_ID = 1
+
+
+def create_pantry_state(apps, schema_editor):
+    apps.get_model('recipes', 'PantryIndexState').objects.get_or_create(
+        pk=PANTRY_STATE_ID
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_minhash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PantryIndexState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.PositiveBigIntegerField(default=0, verbose_name='Поколение')),
+                ('changes', models.PositiveBigIntegerField(default=0, verbose_name='Число изменений')),
+            ],
+            options={
+                'verbose_name': 'Состояние индекса продуктов',
+                'verbose_name_plural': 'Состояния индекса продуктов',
+            },
+        ),
+        migrations.CreateModel(
+            name='PantryIndexChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.PositiveBigIntegerField(verbose_name='Поколение')),
+                ('number', models.PositiveBigIntegerField(verbose_name='Номер изменения')),
+                ('recipe_id', models.BigIntegerField(verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Изменение индекса продуктов',
+                'verbose_name_plural': 'Журнал изменений индекса продуктов',
+                'constraints': [models.UniqueConstraint(fields=('generation', 'number'), name='unique_pantry_change_number')],
+            },
+        ),
+        migrations.RunPython(
+            create_pantry_state, migrations.RunPython.noop
+        ),
+    ]
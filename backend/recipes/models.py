@@ -1,12 +1,14 @@
-import random
-import string
-
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value
 
 from ingredients.models import Ingredient
 from tags.models import Tag
+from users.models import AtomicSaveMixin, CounterFieldsMixin
+from .search import update_search_index
+from .short_links import encode_short_link
 
 
 User = get_user_model()
@@ -15,14 +17,68 @@ RECIPE_MAX_LENGTH = 256
 SHORT_LINK_LENGTH = 5
 MINIMUM_COOKING_TIME = MINIMUM_INGREDIENT_AMOUNT = 1
 MAXIMUM_COOKING_TIME = MAXIMUM_INGREDIENT_AMOUNT = 32000
+EXPORT_STATUS_LENGTH = 16
+RECIPE_COUNTER_FIELDS = frozenset(
+    ('favorites_count', 'shopping_cart_count', 'popularity')
+)
+
 
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                FavoritesListRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCartRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )
+            ),
+        )
 
-class Recipe(models.Model):
+    def for_read(self, user):
+        return (
+            self.with_user_flags(user)
+            .select_related('author')
+            .prefetch_related(
+                'tags',
+                Prefetch(
+                    'recipe_ingredient',
+                    queryset=RecipeIngredient.objects.select_related(
+                        'ingredient'
+                    ),
+                ),
+            )
+        )
+
+    def in_ranking(self, ranking, *fields):
+        recipes = self.in_bulk([recipe_id for recipe_id, *_ in ranking])
+        results = []
+        for recipe_id, *values in ranking:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                for field, value in zip(fields, values):
+                    setattr(recipe, field, value)
+                results.append(recipe)
+        return results
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='recipes'
     )
     name = models.CharField(max_length=RECIPE_MAX_LENGTH)
     image = models.ImageField('Фото', upload_to='recipes_images')
+    image_variants = models.JSONField(
+        'Уменьшенные копии фото', default=dict, editable=False
+    )
     tags = models.ManyToManyField(Tag, related_name='recipes')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -47,30 +103,57 @@ class Recipe(models.Model):
         max_length=SHORT_LINK_LENGTH, unique=True, null=True, blank=True
     )
     created = models.DateTimeField('Дата создания', auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
+    popularity = models.FloatField(
+        'Популярность', default=0, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    minhash = models.BinaryField(
+        'MinHash-сигнатура', null=True, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    counter_fields = RECIPE_COUNTER_FIELDS
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=('-created', '-id'), name='recipe_created_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-created'), name='recipe_author_created_idx'
+            ),
+            models.Index(
+                fields=('-popularity', '-id'), name='recipe_popularity_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
-    def generate_short_link(self):
-        while True:
-            short_link = ''.join(
-                random.choices(
-                    string.ascii_lowercase + string.digits,
-                    k=SHORT_LINK_LENGTH,
-                )
-            )
-            if not Recipe.objects.filter(short_link=short_link).exists():
-                return short_link
+    def get_short_link(self):
+        return self.short_link or encode_short_link(self.pk)
+
+    def ingredient_amounts(self):
+        amounts = {}
+        for ingredient_id, amount in self.recipe_ingredient.values_list(
+            'ingredient_id', 'amount'
+        ):
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+        return amounts
 
+    @transaction.atomic
     def save(self, *args, **kwargs):
-        if not self.short_link:
-            self.short_link = self.generate_short_link()
         super().save(*args, **kwargs)
+        update_search_index(self)
 
 
 class RecipeIngredient(models.Model):
@@ -101,13 +184,16 @@ class RecipeIngredient(models.Model):
     )
 
 
-class ShoppingCartRecipe(models.Model):
+class ShoppingCartRecipe(AtomicSaveMixin, models.Model):
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE, related_name='shopping_cart'
     )
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='shopping_cart'
     )
+    created = models.DateTimeField(
+        'Дата добавления', auto_now_add=True, db_index=True
+    )
 
     class Meta:
         constraints = [
@@ -118,13 +204,16 @@ class ShoppingCartRecipe(models.Model):
         ]
 
 
-class FavoritesListRecipe(models.Model):
+class FavoritesListRecipe(AtomicSaveMixin, models.Model):
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE, related_name='favorites_list'
     )
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='favorites_list'
     )
+    created = models.DateTimeField(
+        'Дата добавления', auto_now_add=True, db_index=True
+    )
 
     class Meta:
         constraints = [
@@ -133,3 +222,142 @@ class FavoritesListRecipe(models.Model):
                 name='unique_user_recipe_in_favorites_list',
             )
         ]
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='feed_entries'
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'), name='unique_user_recipe_in_feed'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', 'author'), name='feed_user_author_idx'
+            )
+        ]
+
+
+class RecipeBucket(models.Model):
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='buckets'
+    )
+    band = models.PositiveSmallIntegerField('Полоса')
+    bucket = models.BigIntegerField('Корзина')
+
+    class Meta:
+        verbose_name = 'LSH-корзина рецепта'
+        verbose_name_plural = 'LSH-корзины рецептов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'band'), name='unique_recipe_band'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('band', 'bucket'), name='recipe_bucket_band_idx'
+            )
+        ]
+
+
+class PantryIndexState(models.Model):
+    generation = models.PositiveBigIntegerField('Поколение', default=0)
+    changes = models.PositiveBigIntegerField('Число изменений', default=0)
+
+    class Meta:
+        verbose_name = 'Состояние индекса продуктов'
+        verbose_name_plural = 'Состояния индекса продуктов'
+
+
+class PantryIndexChange(models.Model):
+    generation = models.PositiveBigIntegerField('Поколение')
+    number = models.PositiveBigIntegerField('Номер изменения')
+    recipe_id = models.BigIntegerField('Рецепт')
+
+    class Meta:
+        verbose_name = 'Изменение индекса продуктов'
+        verbose_name_plural = 'Журнал изменений индекса продуктов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('generation', 'number'),
+                name='unique_pantry_change_number',
+            )
+        ]
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, related_name='shopping_list'
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        ordering = ('ingredient__name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_user_ingredient_in_shopping_list',
+            )
+        ]
+
+
+class ShoppingListExport(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_list_exports'
+    )
+    cart_version = models.PositiveIntegerField('Версия списка покупок')
+    status = models.CharField(
+        'Статус',
+        max_length=EXPORT_STATUS_LENGTH,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    file = models.FileField(
+        'Файл', upload_to='shopping_list_exports', blank=True
+    )
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Дата создания', auto_now_add=True)
+    started = models.DateTimeField('Начало обработки', null=True, blank=True)
+    expires = models.DateTimeField('Хранится до', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списков покупок'
+        ordering = ('-created',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'cart_version'),
+                name='unique_user_cart_version_export',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('status', 'created'), name='export_status_created_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.get_status_display()}'
@@ -0,0 +1,285 @@
+import threading
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from .models import (
+    PantryIndexChange,
+    PantryIndexState,
+    Recipe,
+    RecipeIngredient,
+)
+
+
+PANTRY_RESULTS_LIMIT = 20
+PANTRY_MAX_RESULTS = 100
+PANTRY_MAX_INGREDIENTS = 200
+MAX_PATCHED_CHANGES = 500
+PANTRY_STATE_ID = 1
+
+
+def get_state():
+    return (
+        PantryIndexState.objects.filter(pk=PANTRY_STATE_ID)
+        .values_list('generation', 'changes')
+        .first()
+        or (0, 0)
+    )
+
+
+def lock_state():
+    state, _ = PantryIndexState.objects.select_for_update().get_or_create(
+        pk=PANTRY_STATE_ID
+    )
+    return state
+
+
+@transaction.atomic
+def reset_pantry_index():
+    state = lock_state()
+    state.generation += 1
+    state.changes = 0
+    state.save(update_fields=['generation', 'changes'])
+    PantryIndexChange.objects.all().delete()
+
+
+@transaction.atomic
+def mark_recipe_changed(recipe_id):
+    state = lock_state()
+    state.changes += 1
+    state.save(update_fields=['changes'])
+    PantryIndexChange.objects.create(
+        generation=state.generation, number=state.changes, recipe_id=recipe_id
+    )
+    PantryIndexChange.objects.filter(
+        number__lte=state.changes - MAX_PATCHED_CHANGES
+    ).delete()
+
+
+def load_rows(recipe_ids=None):
+    rows = RecipeIngredient.objects.order_by()
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    pairs = np.array(
+        list(rows.values_list('recipe_id', 'ingredient_id')), dtype=np.int64
+    ).reshape(-1, 2)
+    return np.unique(pairs, axis=0)
+
+
+class PantryIndex:
+    def __init__(
+        self,
+        generation,
+        changes,
+        recipe_ids,
+        sizes,
+        postings,
+        indptr,
+        indices,
+        overrides,
+    ):
+        self.generation = generation
+        self.changes = changes
+        self.recipe_ids = recipe_ids
+        self.sizes = sizes
+        self.postings = postings
+        self.indptr = indptr
+        self.indices = indices
+        self.overrides = overrides
+
+    @classmethod
+    def build(cls, generation, changes, pairs):
+        recipe_ids = np.unique(pairs[:, 0])
+        positions = np.searchsorted(recipe_ids, pairs[:, 0]).astype(np.int32)
+        sizes = np.bincount(positions, minlength=len(recipe_ids)).astype(
+            np.int32
+        )
+        order = np.lexsort((positions, pairs[:, 1]))
+        ingredient_ids, starts = np.unique(
+            pairs[order, 1], return_index=True
+        )
+        postings = dict(
+            zip(
+                ingredient_ids.tolist(),
+                np.split(positions[order], starts[1:]),
+            )
+        )
+        indptr = np.concatenate(([0], np.cumsum(sizes)))
+        return cls(
+            generation,
+            changes,
+            recipe_ids,
+            sizes,
+            postings,
+            indptr,
+            pairs[:, 1],
+            {},
+        )
+
+    def get_ingredients(self, position):
+        if position in self.overrides:
+            return self.overrides[position]
+        if position + 1 < len(self.indptr):
+            return self.indices[
+                self.indptr[position]:self.indptr[position + 1]
+            ]
+        return self.indices[:0]
+
+    def patch(self, changes, recipe_ids, pairs):
+        recipe_ids = np.unique(np.array(recipe_ids, dtype=np.int64))
+        positions = np.searchsorted(self.recipe_ids, recipe_ids)
+        known = np.zeros(len(recipe_ids), dtype=bool)
+        inside = positions < len(self.recipe_ids)
+        known[inside] = self.recipe_ids[positions[inside]] == (
+            recipe_ids[inside]
+        )
+        added = np.intersect1d(recipe_ids[~known], pairs[:, 0])
+        if len(added) and len(self.recipe_ids) and (
+            added[0] <= self.recipe_ids[-1]
+        ):
+            return None
+        all_ids = np.concatenate((self.recipe_ids, added))
+        sizes = np.concatenate(
+            (self.sizes, np.zeros(len(added), dtype=np.int32))
+        )
+        postings = dict(self.postings)
+        overrides = dict(self.overrides)
+        for recipe_id in np.concatenate((recipe_ids[known], added)):
+            position = int(np.searchsorted(all_ids, recipe_id))
+            old = self.get_ingredients(position)
+            new = pairs[pairs[:, 0] == recipe_id, 1]
+            for ingredient_id in np.setdiff1d(old, new).tolist():
+                positions = postings[ingredient_id]
+                postings[ingredient_id] = positions[positions != position]
+            for ingredient_id in np.setdiff1d(new, old).tolist():
+                positions = postings.get(
+                    ingredient_id, np.zeros(0, dtype=np.int32)
+                )
+                postings[ingredient_id] = np.insert(
+                    positions, np.searchsorted(positions, position), position
+                )
+            overrides[position] = new
+            sizes[position] = len(new)
+        return PantryIndex(
+            self.generation,
+            changes,
+            all_ids,
+            sizes,
+            postings,
+            self.indptr,
+            self.indices,
+            overrides,
+        )
+
+    def rank(self, ingredient_ids, limit):
+        counts = np.zeros(len(self.sizes), dtype=np.int32)
+        for ingredient_id in set(ingredient_ids):
+            positions = self.postings.get(ingredient_id)
+            if positions is not None:
+                counts[positions] += 1
+        candidates = np.flatnonzero(counts)
+        if not len(candidates):
+            return []
+        have = counts[candidates]
+        coverage = have / self.sizes[candidates]
+        if len(candidates) > limit:
+            threshold = np.partition(coverage, -limit)[-limit]
+            selected = coverage >= threshold
+            candidates = candidates[selected]
+            have = have[selected]
+            coverage = coverage[selected]
+        missing = self.sizes[candidates] - have
+        recipe_ids = self.recipe_ids[candidates]
+        order = np.lexsort((-recipe_ids, missing, -coverage))[:limit]
+        return [
+            (int(recipe_id), float(share), int(count))
+            for recipe_id, share, count in zip(
+                recipe_ids[order], coverage[order], missing[order]
+            )
+        ]
+
+
+def rank_recipes_in_db(ingredient_ids, limit):
+    recipes = (
+        Recipe.objects.annotate(
+            total=Count('recipe_ingredient__ingredient', distinct=True),
+            have=Count(
+                'recipe_ingredient__ingredient',
+                filter=Q(recipe_ingredient__ingredient__in=ingredient_ids),
+                distinct=True,
+            ),
+        )
+        .filter(have__gt=0)
+        .annotate(
+            coverage=Cast('have', FloatField()) / F('total'),
+            missing=F('total') - F('have'),
+        )
+        .order_by('-coverage', 'missing', '-id')
+        .values_list('id', 'coverage', 'missing')
+    )
+    return list(recipes[:limit])
+
+
+class PantrySearch:
+    def __init__(self):
+        self.index = None
+        self.lock = threading.Lock()
+        self.building = False
+
+    def build(self, generation):
+        try:
+            _, changes = get_state()
+            index = PantryIndex.build(generation, changes, load_rows())
+            if get_state()[0] == generation:
+                self.index = index
+        finally:
+            self.building = False
+            connection.close()
+
+    def schedule_build(self, generation):
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+        threading.Thread(
+            target=self.build, args=(generation,), daemon=True
+        ).start()
+
+    def refresh(self, index, changes):
+        recipe_ids = list(
+            PantryIndexChange.objects.filter(
+                generation=index.generation,
+                number__gt=index.changes,
+                number__lte=changes,
+            ).values_list('recipe_id', flat=True)
+        )
+        if len(recipe_ids) != changes - index.changes:
+            return None
+        with self.lock:
+            if self.index is not index:
+                return self.index
+            patched = index.patch(changes, recipe_ids, load_rows(recipe_ids))
+            if patched is not None:
+                self.index = patched
+        return patched
+
+    def rank(self, ingredient_ids, limit=PANTRY_RESULTS_LIMIT):
+        generation, changes = get_state()
+        index = self.index
+        if index is not None and index.generation == generation and (
+            0 < changes - index.changes <= MAX_PATCHED_CHANGES
+        ):
+            index = self.refresh(index, changes)
+        if (
+            index is None
+            or index.generation != generation
+            or index.changes != changes
+        ):
+            self.schedule_build(generation)
+            return None
+        return index.rank(ingredient_ids, limit)
+
+
+pantry_search = PantrySearch()
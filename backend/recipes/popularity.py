@@ -0,0 +1,80 @@
+from collections import defaultdict
+from datetime import timedelta
+from math import isclose
+
+from django.conf import settings
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import FavoritesListRecipe, Recipe, ShoppingCartRecipe
+
+
+POPULAR_ORDERING = ('-popularity', '-id')
+POPULARITY_WEIGHTS = {
+    FavoritesListRecipe: 2.0,
+    ShoppingCartRecipe: 1.0,
+}
+POPULARITY_HORIZON = 10
+POPULARITY_BATCH_SIZE = 1000
+POPULARITY_TOLERANCE = 1e-3
+
+popularity_updated = Signal()
+
+
+def get_half_life():
+    return timedelta(days=settings.POPULARITY_HALF_LIFE_DAYS)
+
+
+def decay(age):
+    return 0.5 ** (max(age, timedelta()) / get_half_life())
+
+
+def get_event_score(event, now=None):
+    now = now or timezone.now()
+    return POPULARITY_WEIGHTS[type(event)] * decay(now - event.created)
+
+
+def compute_popularity(now):
+    since = now - get_half_life() * POPULARITY_HORIZON
+    scores = defaultdict(float)
+    for model, weight in POPULARITY_WEIGHTS.items():
+        buckets = (
+            model.objects.filter(created__gte=since)
+            .annotate(hour=TruncHour('created'))
+            .values('recipe_id', 'hour')
+            .annotate(count=Count('pk'))
+            .values_list('recipe_id', 'hour', 'count')
+            .order_by()
+        )
+        for recipe_id, hour, count in buckets.iterator():
+            scores[recipe_id] += weight * count * decay(now - hour)
+    return scores
+
+
+def update_popularity(now=None):
+    now = now or timezone.now()
+    scores = compute_popularity(now)
+    current = dict(
+        Recipe.objects.filter(popularity__gt=0).values_list(
+            'pk', 'popularity'
+        )
+    )
+    changed = [
+        Recipe(pk=pk, popularity=scores.get(pk, 0.0))
+        for pk in current.keys() | scores.keys()
+        if not isclose(
+            scores.get(pk, 0.0),
+            current.get(pk, 0.0),
+            rel_tol=POPULARITY_TOLERANCE,
+        )
+    ]
+    Recipe.objects.bulk_update(
+        changed, ['popularity'], batch_size=POPULARITY_BATCH_SIZE
+    )
+    if changed:
+        popularity_updated.send(
+            sender=Recipe, recipe_ids=[recipe.pk for recipe in changed]
+        )
+    return len(changed)
@@ -0,0 +1,85 @@
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connections
+from django.db.models import F, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+FTS_WEIGHTS = '10.0, 1.0'
+
+
+def get_search_vector():
+    return SearchVector(
+        'name', weight='A', config=SEARCH_CONFIG
+    ) + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+
+
+def update_search_index(recipe):
+    connection = connections[recipe._state.db]
+    if connection.vendor == 'postgresql':
+        type(recipe).objects.filter(pk=recipe.pk).update(
+            search_vector=get_search_vector()
+        )
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (recipe.pk,)
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                'VALUES (%s, %s, %s)',
+                (recipe.pk, recipe.name, recipe.text),
+            )
+
+
+def remove_from_search_index(recipe_id, using):
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (recipe_id,)
+            )
+
+
+def get_fts_query(query):
+    return ' '.join(
+        '"{}"*'.format(term) for term in re.findall(r'\w+', query)
+    )
+
+
+def search_recipes(queryset, query):
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        )
+    if vendor == 'sqlite':
+        fts_query = get_fts_query(query)
+        if not fts_query:
+            return queryset.none().annotate(search_rank=Value(0.0))
+        return queryset.filter(
+            id__in=RawSQL(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                (fts_query,),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s '
+                f'AND {FTS_TABLE}.rowid = recipes_recipe.id',
+                (fts_query,),
+            )
+        )
+    return queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query)
+    ).annotate(search_rank=Value(0.0))
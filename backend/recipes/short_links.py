@@ -0,0 +1,58 @@
+import string
+
+
+ALPHABET = string.digits + string.ascii_lowercase + string.ascii_uppercase
+BASE = len(ALPHABET)
+MIN_SHORT_LINK_LENGTH = 6
+MULTIPLIER = 2_654_435_761
+OFFSET = 19_770_413_527
+ROUNDS = 2
+
+
+def get_length(pk):
+    length = MIN_SHORT_LINK_LENGTH
+    while BASE**length <= pk:
+        length += 1
+    return length
+
+
+def to_digits(number, length):
+    digits = []
+    for _ in range(length):
+        number, remainder = divmod(number, BASE)
+        digits.append(remainder)
+    return digits[::-1]
+
+
+def from_digits(digits):
+    number = 0
+    for digit in digits:
+        number = number * BASE + digit
+    return number
+
+
+def encode_short_link(pk):
+    length = get_length(pk)
+    modulus = BASE**length
+    number = pk
+    for _ in range(ROUNDS):
+        number = (number * MULTIPLIER + OFFSET) % modulus
+        number = from_digits(to_digits(number, length)[::-1])
+    return ''.join(ALPHABET[digit] for digit in to_digits(number, length))
+
+
+def decode_short_link(short_link):
+    if len(short_link) < MIN_SHORT_LINK_LENGTH or not all(
+        char in ALPHABET for char in short_link
+    ):
+        return None
+    length = len(short_link)
+    modulus = BASE**length
+    inverse = pow(MULTIPLIER, -1, modulus)
+    number = from_digits(ALPHABET.index(char) for char in short_link)
+    for _ in range(ROUNDS):
+        number = from_digits(to_digits(number, length)[::-1])
+        number = (number - OFFSET) * inverse % modulus
+    if not number or get_length(number) != length:
+        return None
+    return number
@@ -0,0 +1,164 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .aggregates import apply_shopping_list_changes, negate_amounts
+from .background import run_in_background
+from .feed import fan_out_recipe
+from .images import (
+    RECIPE_IMAGE_SIZES,
+    derivatives_outdated,
+    update_derivatives,
+)
+from .models import FavoritesListRecipe, Recipe, ShoppingCartRecipe
+from .pantry import mark_recipe_changed
+from .popularity import get_event_score
+from .search import remove_from_search_index
+from .similarity import update_signatures
+
+
+User = get_user_model()
+
+recipe_ingredients_changed = Signal()
+recipe_stats_changed = Signal()
+bulk_changes = ContextVar('bulk_changes', default=False)
+
+
+@contextmanager
+def applying_bulk_changes():
+    token = bulk_changes.set(True)
+    try:
+        yield
+    finally:
+        bulk_changes.reset(token)
+
+
+def bump_shopping_cart_version(users):
+    users.update(shopping_cart_version=F('shopping_cart_version') + 1)
+
+
+def change_counter(queryset, field, delta):
+    queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def change_recipe_stats(event, counter, delta):
+    Recipe.objects.filter(pk=event.recipe_id).update(
+        **{counter: Greatest(F(counter) + delta, 0)},
+        popularity=Greatest(
+            F('popularity') + delta * get_event_score(event), 0.0
+        ),
+    )
+    recipe_stats_changed.send(sender=Recipe, recipe_ids=[event.recipe_id])
+
+
+def change_recipes_stats(events, counter, delta):
+    if not events:
+        return
+    now = timezone.now()
+    recipe_ids = [event.recipe_id for event in events]
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{counter: Greatest(F(counter) + delta, 0)},
+        popularity=Greatest(
+            F('popularity')
+            + Case(
+                *(
+                    When(
+                        pk=event.recipe_id,
+                        then=Value(delta * get_event_score(event, now)),
+                    )
+                    for event in events
+                ),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+            0.0,
+        ),
+    )
+    recipe_stats_changed.send(sender=Recipe, recipe_ids=recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', 1
+        )
+        run_in_background(fan_out_recipe, instance.pk)
+    if derivatives_outdated(instance, 'image', 'image_variants'):
+        run_in_background(
+            update_derivatives,
+            Recipe,
+            instance.pk,
+            'image',
+            'image_variants',
+            RECIPE_IMAGE_SIZES,
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, using, **kwargs):
+    change_counter(
+        User.objects.filter(pk=instance.author_id), 'recipes_count', -1
+    )
+    remove_from_search_index(instance.pk, using)
+    mark_recipe_changed(instance.pk)
+
+
+@receiver(post_save, sender=FavoritesListRecipe)
+def favorites_list_recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        change_recipe_stats(instance, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=FavoritesListRecipe)
+def favorites_list_recipe_deleted(sender, instance, **kwargs):
+    if bulk_changes.get():
+        return
+    change_recipe_stats(instance, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCartRecipe)
+def shopping_cart_recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_shopping_list_changes(
+            [instance.user_id], instance.recipe.ingredient_amounts()
+        )
+        bump_shopping_cart_version(User.objects.filter(pk=instance.user_id))
+        change_recipe_stats(instance, 'shopping_cart_count', 1)
+
+
+@receiver(pre_delete, sender=ShoppingCartRecipe)
+def shopping_cart_recipe_deleting(sender, instance, **kwargs):
+    if bulk_changes.get():
+        return
+    amounts = instance.recipe.ingredient_amounts()
+    apply_shopping_list_changes([instance.user_id], negate_amounts(amounts))
+
+
+@receiver(post_delete, sender=ShoppingCartRecipe)
+def shopping_cart_recipe_deleted(sender, instance, **kwargs):
+    if bulk_changes.get():
+        return
+    bump_shopping_cart_version(User.objects.filter(pk=instance.user_id))
+    change_recipe_stats(instance, 'shopping_cart_count', -1)
+
+
+@receiver(recipe_ingredients_changed, sender=Recipe)
+def recipe_ingredients_updated(sender, recipe, changes, **kwargs):
+    update_signatures([recipe.pk])
+    if not changes:
+        return
+    mark_recipe_changed(recipe.pk)
+    user_ids = list(
+        ShoppingCartRecipe.objects.filter(recipe=recipe).values_list(
+            'user_id', flat=True
+        )
+    )
+    apply_shopping_list_changes(user_ids, changes)
+    bump_shopping_cart_version(User.objects.filter(pk__in=user_ids))
@@ -0,0 +1,161 @@
+from hashlib import blake2b
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Recipe, RecipeBucket, RecipeIngredient
+
+
+SIGNATURE_SIZE = 128
+LSH_BANDS = 32
+LSH_ROWS = SIGNATURE_SIZE // LSH_BANDS
+LSH_MAX_CANDIDATES = 2000
+HASH_PRIME = 2 ** 31 - 1
+HASH_SEED = 1823
+MIX_STEPS = (
+    (np.uint64(30), np.uint64(0xBF58476D1CE4E5B9)),
+    (np.uint64(27), np.uint64(0x94D049BB133111EB)),
+    (np.uint64(31), np.uint64(1)),
+)
+SIGNATURE_DTYPE = np.dtype('<u4')
+SIGNATURE_BATCH_SIZE = 500
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_MAX_RESULTS = 50
+SIMILARITY_THRESHOLD = 0.3
+DUPLICATE_THRESHOLD = 0.8
+
+multipliers, increments = np.random.default_rng(HASH_SEED).integers(
+    1, HASH_PRIME, size=(2, SIGNATURE_SIZE, 1), dtype=np.int64
+)
+
+
+def get_features(ingredient_ids, tag_ids):
+    features = np.array(
+        [pk * 2 for pk in ingredient_ids] + [pk * 2 + 1 for pk in tag_ids],
+        dtype=np.uint64,
+    )
+    for shift, multiplier in MIX_STEPS:
+        features = (features ^ (features >> shift)) * multiplier
+    return (features % HASH_PRIME).astype(np.int64)
+
+
+def compute_signature(features):
+    if not len(features):
+        return None
+    hashes = (multipliers * features + increments) % HASH_PRIME
+    return hashes.min(axis=1).astype(SIGNATURE_DTYPE)
+
+
+def load_signature(value):
+    return np.frombuffer(bytes(value), dtype=SIGNATURE_DTYPE)
+
+
+def get_buckets(signature):
+    return [
+        int.from_bytes(
+            blake2b(band.tobytes(), digest_size=8).digest(),
+            'big',
+            signed=True,
+        )
+        for band in signature.reshape(LSH_BANDS, LSH_ROWS)
+    ]
+
+
+@transaction.atomic
+def update_signatures(recipe_ids):
+    features = {pk: ([], []) for pk in recipe_ids}
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+        recipe_id__in=features
+    ).values_list('recipe_id', 'ingredient_id'):
+        features[recipe_id][0].append(ingredient_id)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+        recipe_id__in=features
+    ).values_list('recipe_id', 'tag_id'):
+        features[recipe_id][1].append(tag_id)
+    recipes, buckets = [], []
+    for recipe_id, (ingredient_ids, tag_ids) in features.items():
+        signature = compute_signature(get_features(ingredient_ids, tag_ids))
+        if signature is None:
+            recipes.append(Recipe(pk=recipe_id, minhash=None))
+            continue
+        recipes.append(Recipe(pk=recipe_id, minhash=signature.tobytes()))
+        buckets.extend(
+            RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+            for band, bucket in enumerate(get_buckets(signature))
+        )
+    Recipe.objects.bulk_update(recipes, ['minhash'])
+    RecipeBucket.objects.filter(recipe_id__in=features).delete()
+    RecipeBucket.objects.bulk_create(buckets, batch_size=SIGNATURE_BATCH_SIZE)
+    return len(recipes)
+
+
+def backfill_signatures(recipes=None, batch_size=SIGNATURE_BATCH_SIZE):
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    recipe_ids = recipes.order_by('pk').values_list('pk', flat=True)
+    updated = 0
+    batch = []
+    for recipe_id in recipe_ids.iterator(chunk_size=batch_size):
+        batch.append(recipe_id)
+        if len(batch) == batch_size:
+            updated += update_signatures(batch)
+            batch = []
+    if batch:
+        updated += update_signatures(batch)
+    return updated
+
+
+def find_similar(
+    signature,
+    exclude=None,
+    limit=SIMILAR_RECIPES_LIMIT,
+    threshold=SIMILARITY_THRESHOLD,
+):
+    conditions = Q()
+    for band, bucket in enumerate(get_buckets(signature)):
+        conditions |= Q(band=band, bucket=bucket)
+    candidates = RecipeBucket.objects.filter(conditions)
+    if exclude is not None:
+        candidates = candidates.exclude(recipe_id=exclude)
+    rows = list(
+        Recipe.objects.filter(
+            pk__in=candidates.values('recipe_id').distinct()[
+                :LSH_MAX_CANDIDATES
+            ],
+            minhash__isnull=False,
+        ).values_list('pk', 'minhash')
+    )
+    if not rows:
+        return []
+    recipe_ids = np.array([recipe_id for recipe_id, _ in rows])
+    similarity = (
+        np.stack([load_signature(minhash) for _, minhash in rows])
+        == signature
+    ).mean(axis=1)
+    selected = similarity >= threshold
+    recipe_ids = recipe_ids[selected]
+    similarity = similarity[selected]
+    order = np.lexsort((-recipe_ids, -similarity))[:limit]
+    return [
+        (int(recipe_id), float(share))
+        for recipe_id, share in zip(recipe_ids[order], similarity[order])
+    ]
+
+
+def get_signature(recipe):
+    if recipe.minhash is not None:
+        return load_signature(recipe.minhash)
+    return compute_signature(
+        get_features(
+            recipe.recipe_ingredient.values_list('ingredient_id', flat=True),
+            recipe.tags.values_list('pk', flat=True),
+        )
+    )
+
+
+def find_similar_recipes(recipe, **kwargs):
+    signature = get_signature(recipe)
+    if signature is None:
+        return []
+    return find_similar(signature, exclude=recipe.pk, **kwargs)
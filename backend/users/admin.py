@@ -6,7 +6,9 @@ User = get_user_model()
 
 
 class UserAdmin(admin.ModelAdmin):
+    list_display = ('username', 'email', 'recipes_count', 'subscribers_count')
     search_fields = ('email', 'username')
+    readonly_fields = ('recipes_count', 'subscribers_count')
 
 
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_foodgramuser_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptions',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата подписки'),
+            preserve_default=False,
+        ),
+    ]
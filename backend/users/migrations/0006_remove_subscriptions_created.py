@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_subscriptions_created'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='subscriptions',
+            name='created',
+        ),
+    ]
@@ -1,11 +1,37 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 
 
 MAX_USERNAME_LENGTH = MAX_FIRST_NAME_LENGTH = MAX_LAST_NAME_LENGTH = 150
+USER_COUNTER_FIELDS = frozenset(
+    ('shopping_cart_version', 'recipes_count', 'subscribers_count')
+)
 
 
-class FoodgramUser(AbstractUser):
+class CounterFieldsMixin:
+    counter_fields = frozenset()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class AtomicSaveMixin:
+    # Atomic so the counter updates in signal handlers share the transaction.
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+
+class FoodgramUser(CounterFieldsMixin, AbstractUser):
     first_name = models.CharField('Имя', max_length=MAX_FIRST_NAME_LENGTH)
     last_name = models.CharField('Фамилия', max_length=MAX_LAST_NAME_LENGTH)
     bio = models.TextField('Биография', blank=True)
@@ -13,9 +39,22 @@ class FoodgramUser(AbstractUser):
     avatar = models.ImageField(
         'Аватар', upload_to='user_avatars', blank=True, null=True
     )
+    avatar_variants = models.JSONField(
+        'Уменьшенные копии аватара', default=dict, editable=False
+    )
+    shopping_cart_version = models.PositiveIntegerField(
+        'Версия списка покупок', default=0, editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['last_name', 'first_name', 'username']
+    counter_fields = USER_COUNTER_FIELDS
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -26,7 +65,7 @@ class FoodgramUser(AbstractUser):
         return f'Пользователь - {self.username}'
 
 
-class Subscriptions(models.Model):
+class Subscriptions(AtomicSaveMixin, models.Model):
     subscriber = models.ForeignKey(
         FoodgramUser, on_delete=models.CASCADE, related_name='subscriptions'
     )
@@ -0,0 +1,50 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.background import run_in_background
+from recipes.feed import backfill_feed, trim_feed
+from recipes.images import (
+    AVATAR_IMAGE_SIZES,
+    derivatives_outdated,
+    update_derivatives,
+)
+from recipes.signals import bulk_changes
+from .models import FoodgramUser, Subscriptions
+
+
+def change_subscribers_count(user_id, delta):
+    FoodgramUser.objects.filter(pk=user_id).update(
+        subscribers_count=Greatest(F('subscribers_count') + delta, 0)
+    )
+
+
+@receiver(post_save, sender=FoodgramUser)
+def user_saved(sender, instance, **kwargs):
+    if derivatives_outdated(instance, 'avatar', 'avatar_variants'):
+        run_in_background(
+            update_derivatives,
+            FoodgramUser,
+            instance.pk,
+            'avatar',
+            'avatar_variants',
+            AVATAR_IMAGE_SIZES,
+        )
+
+
+@receiver(post_save, sender=Subscriptions)
+def subscription_saved(sender, instance, created, **kwargs):
+    if created:
+        change_subscribers_count(instance.subscribed_to_id, 1)
+        run_in_background(
+            backfill_feed, instance.subscriber_id, instance.subscribed_to_id
+        )
+
+
+@receiver(post_delete, sender=Subscriptions)
+def subscription_deleted(sender, instance, **kwargs):
+    if bulk_changes.get():
+        return
+    change_subscribers_count(instance.subscribed_to_id, -1)
+    trim_feed(instance.subscriber_id, instance.subscribed_to_id)